@@ -1,93 +1,116 @@
-# Update: Delete old forecast rows first, then insert new forecast rows (every API hit)
+# Update: new forecasts are COPYed into a staging table and swapped in for the live table (when the forecast changed)
 # This version:
 # 1) Loads history from Postgres
 # 2) Generates next N-day forecast
-# 3) DELETEs all old rows from analytics.demand_forecast_15d
-# 4) INSERTs fresh forecast rows
+# 3) COPYs the forecast into a staging table
+# 4) swaps it in for analytics.demand_forecast_15d (forecast_writer.py)
+# Steps 1-4 are skipped when the history data, the model and the request are unchanged
+# (forecast cache keyed on a watermark of the history table, see get_data_watermark).
+# Forecasts run as jobs on a worker pool: POST /forecast/jobs + GET /forecast/jobs/<id>,
+# or GET /forecast which waits for the job. Identical in-flight requests share one job.
 #
 # pip install flask pandas numpy scikit-learn joblib sqlalchemy python-dotenv psycopg2-binary
 
 import os
-import joblib
+import sys
+import threading
+from datetime import date
 import pandas as pd
-import numpy as np
 from flask import Flask, jsonify, request
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from dotenv import load_dotenv
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BASE_DIR, "..", "..")))  # platform root: db.py
+
+import db
+from forecaster import forecast_batched
+from forecast_cache import ForecastCache
+from forecast_writer import drop_leftovers, write_swap
+from history_store import HistoryStore
+from forecast_jobs import ForecastJobManager
+from model_registry import ModelRegistry, UnknownModelError
+
 # -----------------------
 # Load env
 # -----------------------
 load_dotenv()
 
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "saved_model", "best_model.pkl")
-MODEL_NAME = "best_5_models_v1"
+MODEL_DIR = os.path.join(BASE_DIR, "saved_model")
+MODEL_PATH = os.path.join(MODEL_DIR, "best_model.pkl")
+MODEL_NAME = os.getenv("MODEL_NAME", "best_5_models_v1")  # default model (served for best_model.pkl)
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE")  # e.g. "r" to memory-map large model arrays
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "10"))  # seconds, 0 = no hot reload
 
-# Your history source (must have: date, category, region, quantity)
-HISTORY_TABLE = "analytics.ml_daily_demand_category_region"  # <-- change this to your real table/view
+# History source (date, category, region, quantity): materialized by pg_query/ML_query.sql,
+# kept current by feature_store.py. Empty = aggregate fact_sales directly.
+HISTORY_TABLE = os.getenv("HISTORY_TABLE", "analytics.ml_daily_demand_category_region")
 
 # Where forecasts are stored
 FORECAST_SCHEMA = "analytics"
 FORECAST_TABLE = "demand_forecast_15d"  # full name => analytics.demand_forecast_15d
-
-
-def get_db_engine():
-    connection_url = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    return create_engine(connection_url, pool_pre_ping=True)
-
-
-engine = get_db_engine()
-model = joblib.load(MODEL_PATH)
+FORECAST_TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {FORECAST_SCHEMA}.{FORECAST_TABLE} (
+    forecast_date DATE,
+    category TEXT,
+    region TEXT,
+    predicted_quantity DOUBLE PRECISION,
+    model_name TEXT
+);
+"""  # first run only; later writes copy the live table's layout
+
+# Forecast cache (in-memory LRU + optional on-disk tier)
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "32"))
+FORECAST_CACHE_DIR = os.getenv("FORECAST_CACHE_DIR")  # e.g. ML_Layer/Demand_Forecasting/.forecast_cache
+FORECAST_CACHE_DISK_SIZE = int(os.getenv("FORECAST_CACHE_DISK_SIZE", "0")) or FORECAST_CACHE_SIZE  # max files
+
+# Local history store (DuckDB): only days after its watermark are pulled from Postgres
+HISTORY_STORE_PATH = os.getenv("HISTORY_STORE_PATH", os.path.join(BASE_DIR, "history_store.duckdb"))
+# re-fetch window for late rows (>= incremental_refresh.RECHECK_DAYS); dates rewritten in
+# Postgres further back are re-fetched from the refresh logs
+HISTORY_RECHECK_DAYS = int(os.getenv("HISTORY_RECHECK_DAYS", "7"))
+
+# Forecast job worker threads (identical in-flight requests are coalesced)
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "2"))
+
+
+# shared pooled engine (DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASSWORD, DB_POOL_* sizing; see db.py)
+engine = db.get_engine()
+# every artifact in saved_model/ is loaded + warmed up; best_model.pkl is served as MODEL_NAME
+models = ModelRegistry(MODEL_DIR, default_name=MODEL_NAME, aliases={"best_model": MODEL_NAME},
+                       mmap_mode=MODEL_MMAP_MODE)
+models.reload()
+
+history_store = HistoryStore(HISTORY_STORE_PATH, recheck_days=HISTORY_RECHECK_DAYS,
+                             source_table=HISTORY_TABLE or None)
+forecast_cache = ForecastCache(max_entries=FORECAST_CACHE_SIZE, disk_dir=FORECAST_CACHE_DIR,
+                               max_disk_entries=FORECAST_CACHE_DISK_SIZE)
+_saved_key = None  # cache key of the forecast currently in the forecast table
+_saved_key_lock = threading.Lock()
 
 app = Flask(__name__)
 
 
-# -----------------------
-# Feature function (same as training)
-# -----------------------
-def make_features(data: pd.DataFrame) -> pd.DataFrame:
-    d = data.sort_values(["category", "region", "date"]).copy()
-
-    d["dow"] = d["date"].dt.dayofweek
-    d["month"] = d["date"].dt.month
-    d["is_weekend"] = (d["dow"] >= 5).astype(int)
-
-    g = d.groupby(["category", "region"], sort=False)
-    d["lag_1"] = g["quantity"].shift(1)
-    d["lag_7"] = g["quantity"].shift(7)
-    d["lag_14"] = g["quantity"].shift(14)
-    d["rollmean_7"] = g["quantity"].shift(1).rolling(7).mean()
-
-    return d
+@app.before_request
+def _ensure_model_watcher():
+    # started here rather than under __main__ so it also runs under gunicorn/WSGI
+    # servers (and in every forked worker); a no-op once the thread is running
+    if MODEL_RELOAD_INTERVAL > 0:
+        models.start_watcher(MODEL_RELOAD_INTERVAL)
 
 
 # -----------------------
-# Pull history from PGSQL
+# Pull history (local store, synced incrementally from PGSQL)
 # -----------------------
 def load_history_from_db(days_back: int = 365) -> pd.DataFrame:
-    q = f"""
-        SELECT 
-            d.full_date AS date, 
-            p.category,
-            c.region,                
-            SUM(f.quantity) AS quantity
-        FROM warehouse.fact_sales f
-        JOIN warehouse.dim_date d ON f.date_id = d.date_id        
-        JOIN warehouse.dim_customer c ON f.customer_id = c.customer_id 
-        JOIN warehouse.dim_product p ON f.product_id = p.product_id
-        WHERE d.full_date >= (CURRENT_DATE - INTERVAL '{days_back} days')
-        GROUP BY d.full_date, p.category, c.region
-        ORDER BY p.category, c.region, d.full_date;
     """
-    with engine.connect() as conn:
-        df = pd.read_sql(text(q), conn)
+    Daily demand per (category, region) for the last `days_back` days.
+
+    The warehouse join/aggregate only runs for days newer than the local
+    store's watermark (plus HISTORY_RECHECK_DAYS for late-arriving rows).
+    """
+    history_store.sync(engine, days_back=days_back)
+    df = history_store.load(days_back=days_back)
 
     df["date"] = pd.to_datetime(df["date"])
     df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce").fillna(0.0)
@@ -98,82 +121,79 @@ def load_history_from_db(days_back: int = 365) -> pd.DataFrame:
 
 
 # -----------------------
-# Forecast next N days (recursive)
+# Data watermark (cache invalidation)
 # -----------------------
-def forecast_recursive(df: pd.DataFrame, horizon: int = 15) -> pd.DataFrame:
-    df = df.sort_values(["category", "region", "date"]).reset_index(drop=True)
-    last_date = df["date"].max()
-    future_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=horizon, freq="D")
-
-    forecasts = []
-
-    for (cat, reg), g in df.groupby(["category", "region"], sort=False):
-        g = g.sort_values("date").copy()
-
-        for d in future_dates:
-            g = pd.concat([g, pd.DataFrame([{
-                "date": d, "category": cat, "region": reg, "quantity": np.nan
-            }])], ignore_index=True)
-
-            gg = make_features(g)
-            row = gg.iloc[-1]
-
-            if pd.isna(row["lag_14"]) or pd.isna(row["rollmean_7"]):
-                yhat = 0.0
-            else:
-                X_row = pd.DataFrame([{
-                    "category": cat,
-                    "region": reg,
-                    "dow": int(row["dow"]),
-                    "month": int(row["month"]),
-                    "is_weekend": int(row["is_weekend"]),
-                    "lag_1": float(row["lag_1"]),
-                    "lag_7": float(row["lag_7"]),
-                    "lag_14": float(row["lag_14"]),
-                    "rollmean_7": float(row["rollmean_7"]),
-                }])
-
-                yhat = float(model.predict(X_row)[0])
-                yhat = max(0.0, yhat)
-
-            g.loc[g.index[-1], "quantity"] = yhat
-
-            forecasts.append({
-                "forecast_date": d.date(),
-                "category": cat,
-                "region": reg,
-                "predicted_quantity": yhat
-            })
-
-    return pd.DataFrame(forecasts)
+# Keyed on the table the history is actually read from: HISTORY_TABLE is
+# refreshed by feature_store.py in its own process, after new facts land, so a
+# fact_sales watermark would cache forecasts made from stale features.
+# Runs on every /forecast request (cache hits included):
+#   - HISTORY_TABLE: MAX(date) + row count (small, pre-aggregated table) and the
+#     last feature_store.py refresh in etl.feature_refreshes (scheduled or --from)
+#   - fact_sales (no HISTORY_TABLE, or it is empty): last finished
+#     incremental_refresh.py batch + MAX(date_id) + COUNT(*). Transactional,
+#     so it also moves on full reloads that log no batch; the count scans
+#     fact_sales, which is why the history table is preferred.
+FACT_WATERMARK_SQL = "SELECT MAX(date_id), COUNT(*) FROM warehouse.fact_sales;"
+
+
+def _etl_table_exists(conn, table: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": table}).scalar()
+
+
+def _history_watermark(conn):
+    max_date, n_rows = conn.execute(text(f"SELECT MAX(date), COUNT(*) FROM {HISTORY_TABLE}")).one()
+    if max_date is None:
+        return None
+    refreshed = None
+    if _etl_table_exists(conn, "etl.feature_refreshes"):
+        refreshed = conn.execute(text("SELECT MAX(refresh_id) FROM etl.feature_refreshes")).scalar()
+    return ("history", str(max_date), n_rows, refreshed)
+
+
+def _fact_watermark(conn):
+    last_batch = None
+    if _etl_table_exists(conn, "etl.refresh_batches"):
+        last_batch = conn.execute(text(
+            "SELECT MAX(batch_id) FROM etl.refresh_batches WHERE finished_at IS NOT NULL"
+        )).scalar()
+    max_date_id, n_rows = conn.execute(text(FACT_WATERMARK_SQL)).one()
+    return ("fact_sales", last_batch, max_date_id, n_rows)
+
+
+def get_data_watermark() -> tuple:
+    """Changes whenever the history the forecast reads changes."""
+    with engine.connect() as conn:
+        return (HISTORY_TABLE and _history_watermark(conn)) or _fact_watermark(conn)
 
 
 # -----------------------
-# DELETE ALL OLD + INSERT NEW
+# Forecast next N days (recursive)
 # -----------------------
-def replace_forecast_table(forecast_df: pd.DataFrame):
+def forecast_recursive(df: pd.DataFrame, horizon: int = 15, model=None) -> pd.DataFrame:
     """
-    Transaction:
-      1) DELETE all existing rows
-      2) INSERT new forecast rows
+    Recursive forecast for every (category, region) series.
+
+    Batched: per-series ring buffers hold the last 14 quantities and all
+    series are predicted with one model.predict call per horizon day
+    (see forecaster.py). Output matches the row-by-row make_features loop.
     """
-    out = forecast_df.copy()
-    out["model_name"] = MODEL_NAME
+    model = model if model is not None else models.get().model
+    return forecast_batched(df, model, horizon=horizon, keys=("category", "region"))
 
-    with engine.begin() as conn:
-        # Delete all old forecast rows
-        conn.execute(text(f"DELETE FROM {FORECAST_SCHEMA}.{FORECAST_TABLE};"))
 
-        # Insert new rows (append)
-        out.to_sql(
-            name=FORECAST_TABLE,
-            con=conn,
-            schema=FORECAST_SCHEMA,
-            if_exists="append",
-            index=False,
-            method="multi",
-            chunksize=5000
-        )
+# -----------------------
+# STAGE + SWAP
+# -----------------------
+def replace_forecast_table(forecast_df: pd.DataFrame, model_name: str = MODEL_NAME):
+    """
+    Replace the forecast table's contents:
+      1) COPY the new rows into a staging table
+      2) swap it in with two renames (readers see old or new, never a mix)
+      3) drop the old table in the background
+    """
+    out = forecast_df.copy()
+    out["model_name"] = model_name
+    write_swap(engine, f"{FORECAST_SCHEMA}.{FORECAST_TABLE}", out, create_sql=FORECAST_TABLE_SQL)
 
 
 @app.route("/health", methods=["GET"])
@@ -181,31 +201,127 @@ def health():
     return jsonify({"status": "ok"}), 200
 
 
+# -----------------------
+# Forecast run (used by the job workers)
+# -----------------------
+class NoHistoryError(ValueError):
+    pass
+
+
+def run_forecast(horizon: int = 15, days_back: int = 365, model_name: str = None) -> dict:
+    global _saved_key
+
+    entry = models.get(model_name)
+
+    # history window is relative to CURRENT_DATE, so today is part of the key;
+    # the artifact stamp catches a replaced .pkl whose sidecar version didn't change
+    cache_key = (horizon, days_back, entry.version, entry.stamp, get_data_watermark(),
+                 date.today().isoformat())
+
+    forecast_df = forecast_cache.get(cache_key)
+    cached = forecast_df is not None
+
+    if not cached:
+        history_df = load_history_from_db(days_back=days_back)
+        if history_df.empty:
+            raise NoHistoryError("No history data found in DB.")
+
+        forecast_df = forecast_recursive(history_df, horizon=horizon, model=entry.model)
+        forecast_cache.put(cache_key, forecast_df)
+
+    # Rewrite the forecast table only if it doesn't already hold this forecast
+    with _saved_key_lock:
+        if _saved_key != cache_key:
+            replace_forecast_table(forecast_df, model_name=entry.name)
+            _saved_key = cache_key
+
+    return {
+        "status": "success",
+        "horizon": horizon,
+        "model": entry.name,
+        "model_version": entry.version,
+        "saved_rows": len(forecast_df),
+        "cached": cached
+    }
+
+
+forecast_jobs = ForecastJobManager(run_forecast, max_workers=FORECAST_WORKERS)
+
+
+def _forecast_params(source) -> dict:
+    return {
+        "horizon": int(source.get("horizon", 15)),
+        "days_back": int(source.get("days_back", 365)),
+        "model_name": source.get("model") or MODEL_NAME,
+    }
+
+
+def _job_key(params: dict) -> tuple:
+    models.get(params["model_name"])  # fail fast on unknown model names
+    # identical (horizon, days_back, model) requests in flight share one job
+    return (params["horizon"], params["days_back"], params["model_name"])
+
+
 @app.route("/forecast", methods=["GET"])
 def forecast():
     """
+    Synchronous forecast (waits for the job).
+    Example:
+    http://127.0.0.1:5000/forecast?horizon=15&days_back=365&model=best_5_models_v1
+    """
+    try:
+        params = _forecast_params(request.args)
+        return jsonify(forecast_jobs.submit_and_wait(_job_key(params), **params))
+    except UnknownModelError as e:
+        return jsonify({"error": e.args[0]}), 404
+    except NoHistoryError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/forecast/jobs", methods=["POST"])
+def submit_forecast_job():
+    """
+    Asynchronous forecast: returns a job id to poll.
     Example:
-    http://127.0.0.1:5000/forecast?horizon=15&days_back=365
+    curl -X POST "http://127.0.0.1:5000/forecast/jobs?horizon=15&days_back=365"
     """
+    params = _forecast_params(request.get_json(silent=True) or request.args)
+    try:
+        job_id = forecast_jobs.submit(_job_key(params), **params)
+    except UnknownModelError as e:
+        return jsonify({"error": e.args[0]}), 404
+    job = forecast_jobs.get(job_id)
+    if job is None:  # finished and already evicted
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "status_url": f"/forecast/jobs/{job_id}"
+    }), 202
 
-    horizon = int(request.args.get("horizon", 15))
-    days_back = int(request.args.get("days_back", 365))
 
-    history_df = load_history_from_db(days_back=days_back)
-    if history_df.empty:
-        return jsonify({"error": "No history data found in DB."}), 400
+@app.route("/models", methods=["GET"])
+def list_models():
+    return jsonify({"default": MODEL_NAME, "models": models.list()}), 200
 
-    forecast_df = forecast_recursive(history_df, horizon=horizon)
 
-    # Delete old forecast and insert new one
-    replace_forecast_table(forecast_df)
+@app.route("/forecast/jobs/<job_id>", methods=["GET"])
+def forecast_job_status(job_id):
+    job = forecast_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job), 200
 
-    return jsonify({
-        "status": "success",
-        "horizon": horizon,
-        "saved_rows": len(forecast_df)
-    })
+
+@app.route("/metrics/db", methods=["GET"])
+def db_metrics():
+    """Connection pool stats: checkouts, wait time for a connection, in-use/idle/overflow."""
+    return jsonify(db.pool_metrics()), 200
 
 
 if __name__ == "__main__":
+    # staging/old tables left by an interrupted write
+    drop_leftovers(engine, f"{FORECAST_SCHEMA}.{FORECAST_TABLE}")
+    # warm the local history store before serving
+    print(f"History store: fetched {history_store.sync(engine)} rows from Postgres.")
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
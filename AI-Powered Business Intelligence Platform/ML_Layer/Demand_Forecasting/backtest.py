@@ -0,0 +1,185 @@
+# Rolling-origin backtesting for the demand forecaster
+#
+# Instead of one holdout (the last VAL_DAYS days), every model is evaluated
+# from many cutoffs (default: 52 weekly cutoffs). For each cutoff:
+#   - fit on all feature rows dated <= cutoff
+#   - forecast the next HORIZON days with forecast_batched (the same
+#     incremental recursive forecaster the API uses), seeded with the
+#     history up to the cutoff
+#   - compare with the actual demand (days without a sales row count as 0)
+#
+# Features are row-based lags of earlier rows only, so a fold's training
+# matrix is just the full feature matrix cut at the cutoff date: it is built
+# once (and cached on disk by features.cached_training_frame) and every fold
+# slices it. Folds run in a process pool; each worker receives the history
+# and feature matrix once.
+#
+# Cutoffs with fewer than MIN_TRAIN_DAYS days of feature rows before them
+# (short histories: the first 14 rows of every series have no lags) are
+# skipped with a warning.
+#
+# Output: MAE / MAPE per category x region (over all folds), per fold, overall.
+#
+# python backtest.py [--csv PATH] [--models Ridge,HistGB,saved] [--cutoffs 52]
+#                    [--step 7] [--horizon 15] [--workers N] [--out results.json]
+#   "saved" = saved_model/best_model.pkl's pipeline, refit at every cutoff
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+from features import cached_training_frame, prepare_history
+from forecaster import CAT_COLS, NUM_COLS, forecast_batched
+from train import FEATURE_CACHE_DIR, MODEL_DIR, TRAIN_WORKERS, candidate_models, make_pipeline
+
+N_CUTOFFS = 52
+CUTOFF_STEP_DAYS = 7
+HORIZON = 15
+MIN_TRAIN_DAYS = 28  # feature days a fold must be able to train on
+SAVED_MODEL = "saved"
+
+
+def make_cutoffs(history: pd.DataFrame, features: pd.DataFrame, n_cutoffs: int = N_CUTOFFS,
+                 step_days: int = CUTOFF_STEP_DAYS, horizon: int = HORIZON,
+                 min_train_days: int = MIN_TRAIN_DAYS) -> list:
+    """Cutoff dates, oldest first; the last one leaves a full horizon of actuals.
+
+    Cutoffs with less than min_train_days of feature rows up to them are dropped.
+    """
+    last = history["date"].max() - pd.Timedelta(days=horizon)
+    cutoffs = [last - pd.Timedelta(days=step_days * i) for i in range(n_cutoffs)]
+    if features.empty:
+        kept = []
+    else:
+        first = features["date"].min() + pd.Timedelta(days=min_train_days - 1)
+        kept = sorted(c for c in cutoffs if c >= first)
+    if len(kept) < n_cutoffs:
+        print(f"⚠️ Skipped {n_cutoffs - len(kept)} of {n_cutoffs} cutoffs: less than {min_train_days} "
+              f"days of training features before them (history {history['date'].min().date()} .. "
+              f"{history['date'].max().date()})")
+    return kept
+
+
+def resolve_models(names: list) -> dict:
+    """name -> unfitted pipeline ("saved" = the published model's pipeline, cloned)."""
+    models = {}
+    for name in names:
+        if name == SAVED_MODEL:
+            models[name] = clone(joblib.load(os.path.join(MODEL_DIR, "best_model.pkl")))
+        else:
+            models[name] = make_pipeline(candidate_models(n_jobs=1)[name])
+    return models
+
+
+# ---------- FOLDS (worker side) ----------
+
+_history = None
+_features = None
+
+
+def _init_worker(history: pd.DataFrame, features: pd.DataFrame):
+    global _history, _features
+    _history, _features = history, features
+
+
+def _run_fold(model_name: str, pipe, cutoff: pd.Timestamp, horizon: int) -> pd.DataFrame:
+    """Fit at `cutoff`, forecast `horizon` days, return per-row errors."""
+    t0 = time.perf_counter()
+    train_rows = _features[_features["date"] <= cutoff]
+    pipe.fit(train_rows[CAT_COLS + NUM_COLS], train_rows["quantity"])
+
+    seen = _history[_history["date"] <= cutoff]
+    fc = forecast_batched(seen, pipe, horizon=horizon, keys=CAT_COLS)
+    fc["date"] = pd.to_datetime(fc["forecast_date"])
+
+    actual = _history[(_history["date"] > cutoff) & (_history["date"] <= cutoff + pd.Timedelta(days=horizon))]
+    out = fc.merge(actual, on=["date"] + CAT_COLS, how="left")
+    out["quantity"] = out["quantity"].fillna(0.0)  # no sales row = zero demand
+    out["abs_err"] = (out["predicted_quantity"] - out["quantity"]).abs()
+    out["model"] = model_name
+    out["cutoff"] = cutoff
+    out["fit_seconds"] = time.perf_counter() - t0
+    return out[["model", "cutoff", "date"] + CAT_COLS + ["quantity", "predicted_quantity", "abs_err", "fit_seconds"]]
+
+
+# ---------- METRICS ----------
+
+def _metrics(g: pd.DataFrame) -> pd.Series:
+    nonzero = g["quantity"] > 0
+    return pd.Series({
+        "MAE": g["abs_err"].mean(),
+        "MAPE": (g.loc[nonzero, "abs_err"] / g.loc[nonzero, "quantity"]).mean() * 100 if nonzero.any() else np.nan,
+        "n": len(g),
+    })
+
+
+def summarize(errors: pd.DataFrame) -> dict:
+    """Per-series, per-fold and overall MAE/MAPE for every model."""
+    return {
+        "series": errors.groupby(["model"] + CAT_COLS).apply(_metrics, include_groups=False).reset_index(),
+        "folds": errors.groupby(["model", "cutoff"]).apply(_metrics, include_groups=False).reset_index(),
+        "overall": (errors.groupby("model").apply(_metrics, include_groups=False)
+                    .sort_values("MAE").reset_index()),
+    }
+
+
+# ---------- RUN ----------
+
+def backtest(df: pd.DataFrame, model_names: list, n_cutoffs: int = N_CUTOFFS,
+             step_days: int = CUTOFF_STEP_DAYS, horizon: int = HORIZON,
+             workers: int = TRAIN_WORKERS, cache_dir: str = FEATURE_CACHE_DIR) -> dict:
+    t0 = time.perf_counter()
+    history = prepare_history(df)
+    features, cache_hit = cached_training_frame(history, cache_dir)
+    cutoffs = make_cutoffs(history, features, n_cutoffs, step_days, horizon)
+    if not cutoffs:
+        raise ValueError("History too short to backtest: no cutoff has enough training data.")
+    models = resolve_models(model_names)
+    print(f"Backtest: {len(models)} model(s) x {len(cutoffs)} cutoffs, horizon {horizon}d, "
+          f"features {'cached' if cache_hit else 'built'} ({len(features):,} rows)")
+
+    tasks = [(name, clone(pipe), cutoff, horizon) for name, pipe in models.items() for cutoff in cutoffs]
+    if workers <= 1:
+        _init_worker(history, features)
+        parts = [_run_fold(*t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(history, features)) as pool:
+            parts = list(pool.map(_run_fold, *zip(*tasks)))
+
+    result = summarize(pd.concat(parts, ignore_index=True))
+    result["seconds"] = time.perf_counter() - t0
+    print("Overall (lower MAE is better):")
+    print(result["overall"])
+    print(f"✅ Backtest done in {result['seconds']:.1f}s")
+    return result
+
+
+def _arg(name: str, default):
+    return type(default)(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+
+if __name__ == "__main__":
+    if "--csv" in sys.argv:
+        source = pd.read_csv(sys.argv[sys.argv.index("--csv") + 1])
+    else:
+        from data_pre import fetch_forecasting_data
+        source = fetch_forecasting_data()
+        if source is None or source.empty:
+            raise SystemExit("❌ No backtest data.")
+
+    names = _arg("--models", ",".join(candidate_models())).split(",")
+    res = backtest(source, names, n_cutoffs=_arg("--cutoffs", N_CUTOFFS), step_days=_arg("--step", CUTOFF_STEP_DAYS),
+                   horizon=_arg("--horizon", HORIZON), workers=_arg("--workers", TRAIN_WORKERS))
+
+    if "--out" in sys.argv:
+        report = {k: v.to_dict(orient="records") for k, v in res.items() if isinstance(v, pd.DataFrame)}
+        with open(sys.argv[sys.argv.index("--out") + 1], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
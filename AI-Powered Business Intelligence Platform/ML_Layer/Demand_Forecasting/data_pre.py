@@ -1,31 +1,32 @@
 import os
+import sys
 import pandas as pd
-from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
 # 1. Load environment variables from the .env file
 load_dotenv()
 
-# 2. Fetch credentials
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
+# 2. Shared connection layer (db.py at the platform root reads DB_HOST/DB_PORT/DB_NAME/DB_USER/DB_PASSWORD)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")))
+import db
 
 def get_db_engine():
-    """Creates a SQLAlchemy engine for PostgreSQL."""
-    # Construct the PostgreSQL connection URL
-    connection_url = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    
-    # Create the engine
-    engine = create_engine(connection_url)
-    return engine
+    """Process-wide pooled SQLAlchemy engine for PostgreSQL (reused across calls)."""
+    return db.get_engine()
+
+def fetch_forecasting_data(days_back=None):
+    """Queries the data warehouse and returns a Pandas DataFrame.
 
-def fetch_forecasting_data():
-    """Queries the data warehouse and returns a Pandas DataFrame."""
+    days_back limits the history to the last N days (filtered on date_id, so
+    only the matching fact_sales partitions are read); None = all history.
+    """
     engine = get_db_engine()
-    query = """
+    date_filter, params = "", None
+    if days_back is not None:
+        since = pd.Timestamp.today().normalize() - pd.Timedelta(days=days_back)
+        date_filter = "WHERE oi.date_id >= %(since_id)s"
+        params = {"since_id": int(since.strftime('%Y%m%d'))}
+    query = f"""
         SELECT 
             d.full_date AS ds, 
             p.category,
@@ -35,6 +36,7 @@ def fetch_forecasting_data():
         JOIN warehouse.dim_date d ON oi.date_id = d.date_id        
         JOIN warehouse.dim_customer c ON oi.customer_id = c.customer_id 
         JOIN warehouse.dim_product p ON oi.product_id = p.product_id
+        {date_filter}
         GROUP BY 1, 2, 3
         ORDER BY 1 ASC;
     """
@@ -43,15 +45,65 @@ def fetch_forecasting_data():
     
     print("Executing query and fetching data...")
     
-    # 4. Execute the query directly into a Pandas DataFrame
+    # 4. Execute the query straight into Arrow-backed pandas columns
+    #    (COPY/ADBC -> pyarrow, no Python object per row; falls back to read_sql)
     try:
-        df = pd.read_sql(query, con=engine)
+        df = db.read_arrow_frame(query, params, engine)
         print(f"✅ Success! Loaded {len(df)} rows into the DataFrame.")
         return df
     except Exception as e:
         print(f"❌ Error fetching data: {e}")
         return None
 
+def fetch_feature_rows(days_back=None):
+    """Ready-made model features (lags, rolling mean, calendar) from the feature store.
+
+    Same columns make_features produces, computed in SQL over the full history
+    (pg_query/ML_query.sql, refreshed by feature_store.py).
+    """
+    engine = get_db_engine()
+    date_filter, params = "", None
+    if days_back is not None:
+        since = pd.Timestamp.today().normalize() - pd.Timedelta(days=days_back)
+        date_filter = "WHERE date >= %(since)s"
+        params = {"since": since.date()}
+    query = f"""
+        SELECT date, category, region, quantity,
+               dow, month, is_weekend, lag_1, lag_7, lag_14, rollmean_7
+        FROM analytics.ml_demand_features
+        {date_filter}
+        ORDER BY category, region, date;
+    """
+    try:
+        df = db.read_arrow_frame(query, params, engine)
+        df["date"] = pd.to_datetime(df["date"])
+        print(f"✅ Success! Loaded {len(df)} feature rows.")
+        return df
+    except Exception as e:
+        print(f"❌ Error fetching features: {e}")
+        return None
+
+def fetch_product_demand(days_back=None):
+    """Daily demand per product_id + region (analytics.ml_daily_demand), for the product-level model."""
+    engine = get_db_engine()
+    date_filter, params = "", None
+    if days_back is not None:
+        since = pd.Timestamp.today().normalize() - pd.Timedelta(days=days_back)
+        date_filter = "WHERE full_date >= %(since)s"
+        params = {"since": since.date()}
+    query = f"""
+        SELECT full_date AS date, product_id, region, daily_qty AS quantity
+        FROM analytics.ml_daily_demand
+        {date_filter};
+    """
+    try:
+        df = db.read_arrow_frame(query, params, engine)
+        print(f"✅ Success! Loaded {len(df)} product demand rows.")
+        return df
+    except Exception as e:
+        print(f"❌ Error fetching product demand: {e}")
+        return None
+
 # --- Run the function ---
 if __name__ == "__main__":
     sales_df = fetch_forecasting_data()
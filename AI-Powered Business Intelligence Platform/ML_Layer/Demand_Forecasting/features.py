@@ -0,0 +1,131 @@
+# Feature builder for training (train.py) and backtests (backtest.py)
+#
+# The model features over a full history:
+#   - calendar: dow, month, is_weekend
+#   - lag_1 / lag_7 / lag_14 and rollmean_7 (mean of the 7 previous rows),
+#     by row within each (category, region) series, like the notebook did
+# Lags are computed on one sorted NumPy array with per-series row positions
+# (no groupby.shift / rolling per group); values match the pandas version.
+# Same columns pg_query/ML_query.sql materializes in analytics.ml_demand_features.
+# The API doesn't call this: forecaster.py computes the same features one step
+# at a time from per-series ring buffers (row-based lags, same NUM_COLS).
+#
+# Feature matrices can be cached on disk (Parquet), keyed by a hash of the
+# input history and FEATURE_VERSION, so a retrain on unchanged data skips the
+# feature step. Only the FEATURE_CACHE_MAX_FILES most recently used files are
+# kept (every new history hash writes a new file).
+
+import glob
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from forecaster import CAT_COLS, NUM_COLS
+
+FEATURE_VERSION = 1  # bump when make_features changes (invalidates the cache)
+LAGS = (1, 7, 14)
+ROLL_WINDOW = 7
+FEATURE_CACHE_MAX_FILES = 8
+
+
+def prepare_history(df: pd.DataFrame, keys=CAT_COLS) -> pd.DataFrame:
+    """Normalize a history frame to date / <keys> (str) / quantity (float)."""
+    keys = list(keys)
+    df = df.rename(columns={"ds": "date", "y": "quantity"})
+    missing = {"date", "quantity", *keys} - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+
+    out = pd.DataFrame({
+        "date": pd.to_datetime(df["date"]).astype("datetime64[ns]"),
+        **{c: df[c].astype(str) for c in keys},
+        "quantity": pd.to_numeric(df["quantity"], errors="coerce").astype("float64").fillna(0.0),
+    })
+    return out.sort_values(keys + ["date"], kind="stable").reset_index(drop=True)
+
+
+def make_features(data: pd.DataFrame, keys=CAT_COLS) -> pd.DataFrame:
+    d = data.sort_values(list(keys) + ["date"], kind="stable").copy()
+
+    # calendar
+    d["dow"] = d["date"].dt.dayofweek
+    d["month"] = d["date"].dt.month
+    d["is_weekend"] = (d["dow"] >= 5).astype(int)
+
+    # row position inside each series (0 = first row of the series)
+    q = d["quantity"].to_numpy(dtype=np.float64)
+    pos = d.groupby(list(keys), sort=False).cumcount().to_numpy()
+
+    for k in LAGS:
+        lag = np.full(len(q), np.nan)
+        lag[k:] = q[:-k]
+        lag[pos < k] = np.nan
+        d[f"lag_{k}"] = lag
+
+    roll = np.full(len(q), np.nan)
+    if len(q) > ROLL_WINDOW:
+        # window ending at row i - 1, for rows with ROLL_WINDOW previous rows in the series
+        windows = np.lib.stride_tricks.sliding_window_view(q[:-1], ROLL_WINDOW)
+        roll[ROLL_WINDOW:] = windows.mean(axis=1)
+        roll[pos < ROLL_WINDOW] = np.nan
+    d[f"rollmean_{ROLL_WINDOW}"] = roll
+
+    return d
+
+
+def training_frame(history: pd.DataFrame, keys=CAT_COLS) -> pd.DataFrame:
+    """Features for every row with a full lag window (what the models train on)."""
+    feat = make_features(history, keys)
+    feat = feat.dropna(subset=["lag_14", "rollmean_7"]).reset_index(drop=True)
+    return feat[["date"] + list(keys) + NUM_COLS + ["quantity"]]
+
+
+# ---------- ON-DISK CACHE ----------
+
+def history_key(history: pd.DataFrame) -> str:
+    """Content hash of the history (+ FEATURE_VERSION)."""
+    h = hashlib.sha1(str(FEATURE_VERSION).encode())
+    h.update(pd.util.hash_pandas_object(history, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def _evict_cache(cache_dir: str, max_files: int):
+    """Delete the least recently used feature files beyond max_files."""
+    paths = []
+    for path in glob.glob(os.path.join(cache_dir, "features_*.parquet")):
+        try:
+            paths.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            pass  # evicted by another writer
+    paths.sort()
+    for _, path in paths[:max(0, len(paths) - max_files)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_training_frame(history: pd.DataFrame, cache_dir: str = None, keys=CAT_COLS,
+                          max_files: int = FEATURE_CACHE_MAX_FILES):
+    """(training frame, cache hit?) — reads/writes cache_dir/features_<key>.parquet."""
+    if not cache_dir:
+        return training_frame(history, keys), False
+
+    path = os.path.join(cache_dir, f"features_{history_key(history)}.parquet")
+    if os.path.exists(path):
+        feat = pd.read_parquet(path)
+        try:
+            os.utime(path)  # mtime = last use, for eviction
+        except FileNotFoundError:
+            pass
+        return feat, True
+
+    feat = training_frame(history, keys)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    feat.to_parquet(tmp, index=False)
+    os.replace(tmp, path)  # readers never see a half-written file
+    _evict_cache(cache_dir, max_files)
+    return feat, False
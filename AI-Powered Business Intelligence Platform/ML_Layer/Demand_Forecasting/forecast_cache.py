@@ -0,0 +1,89 @@
+# Forecast result cache
+#
+# Two tiers:
+#   1) in-memory LRU (OrderedDict, newest at the end)
+#   2) optional on-disk tier (one pickle per key) that survives restarts,
+#      capped at max_disk_entries files (least recently used deleted first)
+#
+# Keys are plain tuples, e.g. (horizon, days_back, model_version, watermark, day).
+# A key only changes when an input to the forecast changes, so a hit can be
+# returned as-is.
+
+import os
+import glob
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class ForecastCache:
+    def __init__(self, max_entries: int = 32, disk_dir: str = None, max_disk_entries: int = None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries or max_entries
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"forecast_{digest}.pkl")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return self._mem[key]
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                df = pd.read_pickle(path)
+                os.utime(path)  # mtime = last use, for eviction
+            except FileNotFoundError:
+                return None
+            self._remember(key, df)
+            return df
+
+        return None
+
+    def put(self, key, df: pd.DataFrame):
+        self._remember(key, df)
+        if self.disk_dir:
+            # write to a temp file first so readers never see a half-written pickle
+            # (unique per writer: two jobs may put the same key at once)
+            path = self._disk_path(key)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            df.to_pickle(tmp)
+            os.replace(tmp, path)
+            self._evict_disk()
+
+    def _remember(self, key, df: pd.DataFrame):
+        with self._lock:
+            self._mem[key] = df
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def _evict_disk(self):
+        """Delete the least recently used pickles beyond max_disk_entries."""
+        paths = []
+        for path in glob.glob(os.path.join(self.disk_dir, "forecast_*.pkl")):
+            try:
+                paths.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass  # evicted by another writer
+        paths.sort()
+        for _, path in paths[:max(0, len(paths) - self.max_disk_entries)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
@@ -0,0 +1,112 @@
+# Forecast job queue
+#
+# Forecasts run on a worker thread pool instead of inside the Flask request:
+#   - submit() returns a job id right away
+#   - identical requests (same key) that are queued or running share one job,
+#     so N concurrent callers cause one computation
+#   - finished jobs are kept (up to `keep_finished`) so their status can be polled
+#   - job records are only read/changed under the manager's lock; callers that
+#     block on a job hold its future, so eviction can't pull it from under them
+
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class UnknownJobError(KeyError):
+    pass
+
+
+class ForecastJobManager:
+    def __init__(self, run_fn, max_workers: int = 2, keep_finished: int = 200):
+        self.run_fn = run_fn
+        self.keep_finished = keep_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="forecast-job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job_id -> job record
+        self._inflight = {}         # key -> job_id (queued or running)
+
+    def submit(self, key, **params) -> str:
+        """Queue a job for `key`, or return the id of the identical in-flight job."""
+        return self._submit(key, params)[0]
+
+    def submit_and_wait(self, key, timeout: float = None, **params):
+        """submit() + block until the job finishes; returns its result or raises its error."""
+        _, future = self._submit(key, params)
+        return future.result(timeout=timeout)
+
+    def _submit(self, key, params: dict):
+        """(job_id, future) of a new or the identical in-flight job."""
+        with self._lock:
+            job_id = self._inflight.get(key)
+            if job_id is not None:
+                job = self._jobs[job_id]
+                job["callers"] += 1
+                return job_id, job["future"]
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "params": params,
+                "status": "queued",
+                "callers": 1,
+                "submitted_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+            self._inflight[key] = job_id
+            # _run waits for the lock, so the future is stored before the job starts
+            future = self._pool.submit(self._run, job_id, key, params)
+            self._jobs[job_id]["future"] = future
+            self._evict()
+            return job_id, future
+
+    def _update(self, job_id: str, done_key=None, **fields):
+        """Change a job record under the lock (and release its in-flight key once finished)."""
+        with self._lock:
+            if done_key is not None:
+                self._inflight.pop(done_key, None)
+            job = self._jobs.get(job_id)
+            if job is not None:  # evicted records are not resurrected
+                job.update(fields)
+
+    def _run(self, job_id: str, key, params: dict):
+        self._update(job_id, status="running", started_at=_now())
+        try:
+            result = self.run_fn(**params)
+        except Exception as e:
+            self._update(job_id, done_key=key, error=str(e), status="failed", finished_at=_now())
+            raise
+        self._update(job_id, done_key=key, result=result, status="done", finished_at=_now())
+        return result
+
+    def _evict(self):
+        """Drop the oldest finished jobs beyond keep_finished (lock held)."""
+        finished = [j for j, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str):
+        """Public view of a job (no future), or None if unknown/evicted."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if k != "future"}
+
+    def wait(self, job_id: str, timeout: float = None):
+        """Block until the job finishes; returns its result or raises its error."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise UnknownJobError(f"Unknown job: {job_id}")
+            future = job["future"]
+        return future.result(timeout=timeout)
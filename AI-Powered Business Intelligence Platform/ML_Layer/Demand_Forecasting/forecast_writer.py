@@ -0,0 +1,183 @@
+# Forecast table writer: COPY into a staging table, then swap it in
+#
+# Replaces "DELETE everything + INSERT" (dead tuples in the live table, and
+# readers blocked behind the writer's locks for the whole load):
+#   1. CREATE TABLE <table>__staging_<stamp> (LIKE <table> INCLUDING ALL)
+#   2. COPY the rows into it (DataFrames, or an iterator of DataFrame chunks
+#      that is streamed as it is produced), ANALYZE; committed on its own, the
+#      live table is untouched
+#   3. swap in one short transaction: live -> <table>__old_<stamp>,
+#      staging -> live (ACCESS EXCLUSIVE only for the two renames, with a
+#      lock_timeout + retries so a long reader can't stall the writer forever)
+#   4. DROP the old table (from a background thread for long-running servers;
+#      CLIs that exit right after the swap pass background_drop=False)
+# Readers see either the old or the new forecast, never a partial one.
+# Write time is one COPY into a fresh table, so it tracks the new row count
+# only (no dead tuples from earlier runs to skip or vacuum).
+#
+# Views on the live table would keep pointing at the renamed old one (views
+# bind to the table, not its name); the forecast tables have none. Grants are
+# not copied by LIKE: they are re-applied from the live table in the swap.
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from bulk_load import copy_dataframe
+
+SWAP_LOCK_TIMEOUT = "5s"
+SWAP_RETRIES = 3
+STAGING_MAX_AGE = timedelta(hours=6)  # younger __staging_ tables may be a write in progress
+STAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+def _split(qualified_table: str):
+    schema, _, table = qualified_table.rpartition(".")
+    return schema or "public", table
+
+
+def _exists(cur, schema: str, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{schema}"."{table}"',))
+    return cur.fetchone()[0]
+
+
+def _grants(cur, schema: str, table: str) -> list:
+    """(privilege, grantee) pairs granted on the live table, to re-grant after the swap."""
+    cur.execute(
+        "SELECT grantee, privilege_type FROM information_schema.role_table_grants "
+        "WHERE table_schema = %s AND table_name = %s AND grantee <> current_user",
+        (schema, table)
+    )
+    return [(privilege, grantee) for grantee, privilege in cur.fetchall()]
+
+
+# ---------- STAGE ----------
+
+def _load_staging(engine, schema: str, table: str, staging: str, frames, create_sql: str = None) -> int:
+    raw = engine.raw_connection()
+    rows = 0
+    try:
+        cur = raw.cursor()
+        if not _exists(cur, schema, table):
+            if create_sql is None:
+                raise RuntimeError(f"{schema}.{table} does not exist and no create_sql was given.")
+            cur.execute(create_sql)
+        cur.execute(f'CREATE TABLE "{schema}"."{staging}" (LIKE "{schema}"."{table}" INCLUDING ALL)')
+
+        for df in ([frames] if isinstance(frames, pd.DataFrame) else frames):
+            if len(df):
+                rows += copy_dataframe(cur, df, f'"{schema}"."{staging}"')
+        cur.execute(f'ANALYZE "{schema}"."{staging}"')
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return rows
+
+
+# ---------- SWAP ----------
+
+def _swap(engine, schema: str, table: str, staging: str, old: str):
+    for attempt in range(1, SWAP_RETRIES + 1):
+        raw = engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+            cur.execute(f'LOCK TABLE "{schema}"."{table}" IN ACCESS EXCLUSIVE MODE')
+            grants = _grants(cur, schema, table)
+            cur.execute(f'ALTER TABLE "{schema}"."{table}" RENAME TO "{old}"')
+            cur.execute(f'ALTER TABLE "{schema}"."{staging}" RENAME TO "{table}"')
+            for privilege, grantee in grants:
+                role = grantee if grantee == "PUBLIC" else f'"{grantee}"'
+                cur.execute(f'GRANT {privilege} ON "{schema}"."{table}" TO {role}')
+            raw.commit()
+            return
+        except Exception as e:
+            raw.rollback()
+            if attempt == SWAP_RETRIES or "lock timeout" not in str(e):
+                raise
+            print(f"⚠️ Swap of {schema}.{table} waited too long for readers, retrying ({attempt}/{SWAP_RETRIES})")
+        finally:
+            raw.close()
+
+
+def _drop(engine, schema: str, name: str):
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(f'DROP TABLE IF EXISTS "{schema}"."{name}"')  # waits for readers still on it
+        raw.commit()
+    except Exception as e:
+        raw.rollback()
+        print(f"⚠️ Could not drop {schema}.{name}: {e}")
+    finally:
+        raw.close()
+
+
+def _stamp_time(name: str):
+    """Creation time encoded in a __staging_/__old_ table name (None if unparsable)."""
+    try:
+        return datetime.strptime(name.rsplit("_", 1)[-1][:14], STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def drop_leftovers(engine, qualified_table: str, staging_max_age: timedelta = STAGING_MAX_AGE) -> list:
+    """Drop tables left behind by interrupted writes.
+
+    __old_ tables are always dropped (already swapped out). A __staging_ table
+    may belong to a write still running in another process, so it is only
+    dropped once it is older than staging_max_age.
+    """
+    schema, table = _split(qualified_table)
+    cutoff = datetime.now() - staging_max_age
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(
+            "SELECT tablename FROM pg_tables WHERE schemaname = %s "
+            "AND (tablename LIKE %s OR tablename LIKE %s)",
+            (schema, f"{table}\\_\\_staging\\_%", f"{table}\\_\\_old\\_%")
+        )
+        names = []
+        for (name,) in cur.fetchall():
+            created = _stamp_time(name)
+            if name.startswith(f"{table}__old_") or (created is not None and created < cutoff):
+                names.append(name)
+    finally:
+        raw.close()
+    for name in names:
+        _drop(engine, schema, name)
+    return names
+
+
+# ---------- PUBLIC ----------
+
+def write_swap(engine, qualified_table: str, frames, create_sql: str = None,
+               background_drop: bool = True) -> int:
+    """Replace all rows of `qualified_table` with `frames` (DataFrame or iterator of them).
+
+    create_sql creates the live table the first time (its columns/indexes are
+    the template for every staging table). Returns rows written.
+    """
+    schema, table = _split(qualified_table)
+    stamp = f"{datetime.now():{STAMP_FORMAT}}{time.perf_counter_ns() % 1000:03d}"
+    staging, old = f"{table}__staging_{stamp}", f"{table}__old_{stamp}"
+
+    try:
+        rows = _load_staging(engine, schema, table, staging, frames, create_sql)
+        _swap(engine, schema, table, staging, old)
+    except Exception:
+        _drop(engine, schema, staging)
+        raise
+
+    if background_drop:
+        threading.Thread(target=_drop, args=(engine, schema, old), daemon=True,
+                         name=f"drop-{old}").start()
+    else:
+        _drop(engine, schema, old)
+    return rows
@@ -0,0 +1,121 @@
+# Batched recursive forecaster
+#
+# Same output as the row-by-row recursive loop (append a NaN row, rerun
+# make_features on the whole group, predict one row), but:
+#   - every series keeps a ring buffer of its last 14 quantities, so
+#     lag_1 / lag_7 / lag_14 / rollmean_7 are O(1) lookups per step
+#   - all series are predicted with ONE model.predict call per horizon day
+#
+# Features are row-based exactly like make_features (shift over the series'
+# rows, not calendar days), and a step with fewer than 14 prior rows predicts
+# 0.0, like the original loop.
+#
+# The key columns are the model's categorical inputs: ("category", "region")
+# for the served model, ("product_id", "region") for product_forecast.py, which
+# builds SeriesState straight from each series' last WINDOW rows and runs
+# forecast_state on chunks of series.
+
+import numpy as np
+import pandas as pd
+
+WINDOW = 14  # longest lag used by the model (lag_14)
+
+CAT_COLS = ["category", "region"]
+NUM_COLS = ["dow", "month", "is_weekend", "lag_1", "lag_7", "lag_14", "rollmean_7"]
+
+
+class SeriesState:
+    """Ring buffer of the last WINDOW quantities for many series at once."""
+
+    def __init__(self, n_series: int, window: int = WINDOW):
+        self.window = window
+        self.buf = np.zeros((n_series, window), dtype=np.float64)
+        self.count = np.zeros(n_series, dtype=np.int64)  # rows seen per series
+        self.head = 0  # column the next value is written to
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame, keys, window: int = WINDOW, counts=None):
+        """Seed buffers with the tail of each series (df sorted by keys + date).
+
+        counts: total rows per series when df only holds the tail (default: rows in df).
+        """
+        g = df.groupby(list(keys), sort=False)
+        state = cls(g.ngroups, window)
+        state.count[:] = g.size().to_numpy() if counts is None else counts
+
+        tail = g.tail(window)
+        series_idx = tail.groupby(list(keys), sort=False).ngroup().to_numpy()
+        back = tail.groupby(list(keys), sort=False).cumcount(ascending=False).to_numpy()
+        # newest value sits just before head (head = 0 -> column window - 1)
+        state.buf[series_idx, window - 1 - back] = tail["quantity"].to_numpy(dtype=np.float64)
+        return state
+
+    def subset(self, rows: slice) -> "SeriesState":
+        """Independent state for a slice of the series (same head position)."""
+        part = SeriesState(0, self.window)
+        part.buf = self.buf[rows].copy()
+        part.count = self.count[rows].copy()
+        part.head = self.head
+        return part
+
+    def lag(self, k: int) -> np.ndarray:
+        return self.buf[:, (self.head - k) % self.window]
+
+    def rollmean(self, k: int) -> np.ndarray:
+        cols = [(self.head - j) % self.window for j in range(k, 0, -1)]
+        return self.buf[:, cols].sum(axis=1) / k
+
+    def push(self, values: np.ndarray):
+        self.buf[:, self.head] = values
+        self.head = (self.head + 1) % self.window
+        self.count += 1
+
+
+def forecast_batched(df: pd.DataFrame, model, horizon: int = 15, keys=("category", "region")) -> pd.DataFrame:
+    """Recursive N-day forecast for every series in df with one predict call per day.
+
+    df must have: date, quantity and the key columns.
+    """
+    keys = list(keys)
+    df = df.sort_values(keys + ["date"]).reset_index(drop=True)
+    last_date = df["date"].max()
+    future_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=horizon, freq="D")
+
+    series = df.drop_duplicates(keys)[keys].reset_index(drop=True)
+    state = SeriesState.from_history(df, keys)
+    n = len(series)
+    preds = forecast_state(series, state, model, future_dates, keys)
+
+    out = series.loc[series.index.repeat(horizon)].reset_index(drop=True)
+    out.insert(0, "forecast_date", np.tile(np.array([d.date() for d in future_dates], dtype=object), n))
+    out["predicted_quantity"] = preds.ravel()
+    return out
+
+
+def forecast_state(series: pd.DataFrame, state: SeriesState, model, future_dates, keys) -> np.ndarray:
+    """(n_series, horizon) predictions; advances `state` one row per future date."""
+    keys = list(keys)
+    n = len(series)
+    preds = np.zeros((n, len(future_dates)), dtype=np.float64)
+
+    for step, d in enumerate(future_dates):
+        ready = state.count >= WINDOW
+        yhat = np.zeros(n, dtype=np.float64)
+
+        if ready.any():
+            dow = d.dayofweek
+            X = series.loc[ready, keys].reset_index(drop=True)
+            X["dow"] = dow
+            X["month"] = d.month
+            X["is_weekend"] = int(dow >= 5)
+            X["lag_1"] = state.lag(1)[ready]
+            X["lag_7"] = state.lag(7)[ready]
+            X["lag_14"] = state.lag(14)[ready]
+            X["rollmean_7"] = state.rollmean(7)[ready]
+
+            yhat[ready] = np.maximum(0.0, model.predict(X[keys + NUM_COLS]).astype(np.float64))
+
+        state.push(yhat)
+        preds[:, step] = yhat
+
+    return preds
@@ -0,0 +1,223 @@
+# Local history store for the forecasting service
+#
+# Keeps daily (date, category, region, quantity) demand in a local DuckDB
+# file so the warehouse doesn't get queried on every request. The source is
+# the materialized feature-store table (analytics.ml_daily_demand_category_region)
+# when given, else the fact/dimension join below:
+#   - first sync: pull the requested window from Postgres
+#   - later syncs: pull only days after the stored watermark, re-fetching the
+#     last `recheck_days` days to pick up late-arriving rows, and everything
+#     from the earliest date rewritten in Postgres since the last sync: the
+#     change log is etl.feature_refreshes (feature_store.py, scheduled or
+#     --from runs) for the feature-store table, etl.fact_sales_changes
+#     (incremental_refresh.py batches) for the fact join
+#   - a request reaching further back than what is stored backfills the gap
+#
+# The DuckDB file is opened per operation rather than held open, and never
+# while Postgres is queried. DuckDB allows one writing process per file: a
+# connection that hits another process's lock is retried with backoff
+# (LOCK_RETRIES); with many workers syncing at once give each its own
+# HISTORY_STORE_PATH.
+#
+# Incremental syncs (a few days) run the Postgres query as a named prepared
+# statement (db.execute_prepared): parsed/planned once per pooled connection.
+# Long windows (first sync, backfills) go through db.read_arrow_frame, which
+# streams the result as Arrow instead of building a Python tuple per row.
+
+import threading
+import time
+from datetime import date, timedelta
+
+import duckdb
+import pandas as pd
+from sqlalchemy import text
+
+import db
+
+HISTORY_QUERY = """
+    SELECT
+        d.full_date AS date,
+        p.category,
+        c.region,
+        SUM(f.quantity) AS quantity
+    FROM warehouse.fact_sales f
+    JOIN warehouse.dim_date d ON f.date_id = d.date_id
+    JOIN warehouse.dim_customer c ON f.customer_id = c.customer_id
+    JOIN warehouse.dim_product p ON f.product_id = p.product_id
+    WHERE f.date_id >= %(start)s
+      AND f.date_id < %(end)s
+    GROUP BY d.full_date, p.category, c.region;
+"""
+
+
+TABLE_HISTORY_QUERY = """
+    SELECT date, category, region, quantity
+    FROM {table}
+    WHERE date >= %(start)s
+      AND date < %(end)s;
+"""
+
+# earliest changed date + last log id after the id this store has applied
+FEATURE_CHANGES_QUERY = """
+    SELECT MIN(start_date), MAX(refresh_id) FROM etl.feature_refreshes WHERE refresh_id > :after
+"""
+FACT_CHANGES_QUERY = """
+    SELECT MIN(date_id), MAX(batch_id) FROM etl.fact_sales_changes WHERE batch_id > :after
+"""
+
+ARROW_MIN_DAYS = 31  # windows at least this long are fetched as Arrow
+LOCK_RETRIES = 20    # DuckDB file locked by another process: retry, 0.05s, 0.1s, ... apart
+LOCK_BACKOFF = 0.05
+
+
+def to_date_id(d: date) -> int:
+    """fact_sales.date_id (YYYYMMDD); filtering on it lets Postgres prune partitions."""
+    return d.year * 10_000 + d.month * 100 + d.day
+
+
+def from_date_id(date_id: int) -> date:
+    return date(date_id // 10_000, date_id // 100 % 100, date_id % 100)
+
+
+class HistoryStore:
+    def __init__(self, path: str, recheck_days: int = 7, source_table: str = None):
+        self.path = path
+        self.recheck_days = recheck_days
+        self.source_table = source_table
+        self._lock = threading.Lock()
+        if source_table:
+            self._statement = "history_" + source_table.replace(".", "_")
+            self._query = TABLE_HISTORY_QUERY.format(table=source_table)
+            arg_types = {"start": "date", "end": "date"}
+        else:
+            self._statement = "history_fact_sales"
+            self._query = HISTORY_QUERY
+            arg_types = {"start": "int", "end": "int"}
+        db.register_prepared(self._statement, self._query.rstrip().rstrip(";"), arg_types)
+        with self._connect() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS daily_history (
+                    date DATE,
+                    category VARCHAR,
+                    region VARCHAR,
+                    quantity DOUBLE
+                )
+            """)
+            con.execute("CREATE TABLE IF NOT EXISTS store_meta (key VARCHAR PRIMARY KEY, value VARCHAR)")
+
+    # -----------------------
+    # Postgres side
+    # -----------------------
+    def fetch(self, engine, start_date: date, end_date: date) -> pd.DataFrame:
+        if self.source_table:
+            params = {"start": start_date, "end": end_date}
+        else:
+            params = {"start": to_date_id(start_date), "end": to_date_id(end_date)}
+        if (end_date - start_date).days >= ARROW_MIN_DAYS:
+            df = db.read_arrow_frame(self._query, params, engine)
+        else:
+            with engine.connect() as conn:
+                df = db.execute_prepared(conn, self._statement, params)
+        df["date"] = pd.to_datetime(df["date"])
+        df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce").fillna(0.0)
+        return df[["date", "category", "region", "quantity"]]
+
+    def changes(self, engine, after_id: int):
+        """(earliest date rewritten in Postgres after log id `after_id`, last log id)."""
+        log_table = "etl.feature_refreshes" if self.source_table else "etl.fact_sales_changes"
+        query = FEATURE_CHANGES_QUERY if self.source_table else FACT_CHANGES_QUERY
+        with engine.connect() as conn:
+            if not conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": log_table}).scalar():
+                return None, None
+            first, last_id = conn.execute(text(query), {"after": after_id}).one()
+        if first is not None and not self.source_table:
+            first = from_date_id(first)
+        return first, last_id
+
+    # -----------------------
+    # Local side
+    # -----------------------
+    def _connect(self, read_only: bool = False):
+        for attempt in range(1, LOCK_RETRIES + 1):
+            try:
+                return duckdb.connect(self.path, read_only=read_only)
+            except duckdb.IOException as e:
+                if "lock" not in str(e).lower() or attempt == LOCK_RETRIES:
+                    raise
+                time.sleep(LOCK_BACKOFF * attempt)
+
+    @staticmethod
+    def _get_meta(con, key: str):
+        row = con.execute("SELECT value FROM store_meta WHERE key = ?", [key]).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_meta(con, key: str, value: str):
+        con.execute("INSERT OR REPLACE INTO store_meta VALUES (?, ?)", [key, value])
+
+    @staticmethod
+    def _replace_range(con, df: pd.DataFrame, start_date: date, end_date: date):
+        con.execute("BEGIN TRANSACTION")
+        try:
+            con.execute("DELETE FROM daily_history WHERE date >= ? AND date < ?", [start_date, end_date])
+            con.register("new_rows", df)
+            con.execute("INSERT INTO daily_history SELECT date, category, region, quantity FROM new_rows")
+            con.unregister("new_rows")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def sync(self, engine, days_back: int = 365) -> int:
+        """Bring the store up to date for a `days_back` window; returns rows fetched."""
+        today = date.today()
+        wanted_from = today - timedelta(days=days_back)
+        tomorrow = today + timedelta(days=1)
+        fetched = 0
+
+        with self._lock:
+            with self._connect(read_only=True) as con:
+                loaded_from = self._get_meta(con, "loaded_from")
+                change_id = int(self._get_meta(con, "change_id") or 0)
+                watermark = con.execute("SELECT MAX(date) FROM daily_history").fetchone()[0]
+
+            # read before the data, so changes committed meanwhile are seen next time
+            changed_from, last_change_id = self.changes(engine, change_id)
+
+            if loaded_from is None or watermark is None:
+                ranges = [(wanted_from, tomorrow)]
+                loaded_from = wanted_from
+            else:
+                loaded_from = date.fromisoformat(loaded_from)
+                recheck_from = watermark - timedelta(days=self.recheck_days)
+                if changed_from is not None:
+                    recheck_from = min(recheck_from, max(changed_from, loaded_from))
+                ranges = [(recheck_from, tomorrow)]
+                if wanted_from < loaded_from:
+                    ranges.append((wanted_from, loaded_from))
+                    loaded_from = wanted_from
+
+            frames = [(start_date, end_date, self.fetch(engine, start_date, end_date))
+                      for start_date, end_date in ranges]
+
+            with self._connect() as con:
+                for start_date, end_date, df in frames:
+                    self._replace_range(con, df, start_date, end_date)
+                    fetched += len(df)
+                self._set_meta(con, "loaded_from", loaded_from.isoformat())
+                if last_change_id is not None:
+                    self._set_meta(con, "change_id", str(last_change_id))
+
+        return fetched
+
+    def load(self, days_back: int = 365) -> pd.DataFrame:
+        since = date.today() - timedelta(days=days_back)
+        with self._lock, self._connect(read_only=True) as con:
+            df = con.execute("""
+                SELECT date, category, region, quantity
+                FROM daily_history
+                WHERE date >= ?
+                ORDER BY category, region, date
+            """, [since]).df()
+        df["date"] = pd.to_datetime(df["date"])
+        return df
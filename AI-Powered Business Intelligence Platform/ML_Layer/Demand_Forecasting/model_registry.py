@@ -0,0 +1,159 @@
+# Model registry for the forecasting API
+#
+# - loads every *.pkl artifact in saved_model/ (optionally memory-mapped)
+# - an optional sidecar <artifact>.json can set {"name": ..., "version": ...};
+#   otherwise the name is the file stem (or an alias) and the version its mtime
+# - every model is warmed up with a dummy batch predict before it is served
+# - a watcher thread reloads new/changed artifacts and swaps the whole
+#   name -> model map in one assignment, so requests never see a half-loaded model;
+#   start_watcher() is idempotent, so a server can call it on every request
+#   (also restarts it in a forked worker, where the parent's thread is gone)
+# - stamp (mtime + size of the .pkl) identifies the artifact itself: a new file
+#   with an unchanged sidecar version still gets a new stamp
+
+import os
+import json
+import glob
+import threading
+import time
+from dataclasses import dataclass
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from forecaster import CAT_COLS, NUM_COLS
+
+
+@dataclass(frozen=True)
+class RegisteredModel:
+    name: str
+    version: str
+    path: str
+    mtime: float
+    size: int
+    model: object
+
+    @property
+    def stamp(self) -> str:
+        return f"{self.mtime:.6f}:{self.size}"
+
+
+class UnknownModelError(KeyError):
+    pass
+
+
+def _warmup_frame(model, n_rows: int = 64) -> pd.DataFrame:
+    """Dummy feature batch shaped like a forecast step (known categories if the model has them)."""
+    cat_values = {c: ["warmup"] for c in CAT_COLS}
+    try:
+        encoder = model.named_steps["prep"].named_transformers_["cat"]
+        cat_values = dict(zip(CAT_COLS, encoder.categories_))
+    except (AttributeError, KeyError):
+        pass
+
+    X = pd.DataFrame({c: np.resize(np.asarray(v, dtype=object), n_rows) for c, v in cat_values.items()})
+    for c in NUM_COLS:
+        X[c] = 1 if c in ("dow", "month", "is_weekend") else 1.0
+    return X[CAT_COLS + NUM_COLS]
+
+
+class ModelRegistry:
+    def __init__(self, model_dir: str, default_name: str, aliases: dict = None, mmap_mode: str = None):
+        self.model_dir = model_dir
+        self.default_name = default_name
+        self.aliases = aliases or {}
+        self.mmap_mode = mmap_mode
+        self._models = {}  # name -> RegisteredModel (replaced, never mutated)
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    # -----------------------
+    # Loading
+    # -----------------------
+    def _describe(self, path: str):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        stat = os.stat(path)
+        mtime = stat.st_mtime
+        name = self.aliases.get(stem, stem)
+        version = f"{name}@{int(mtime)}"
+
+        meta_path = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            name = meta.get("name", name)
+            version = meta.get("version", version)
+        return name, version, mtime, stat.st_size
+
+    def _load(self, path: str) -> RegisteredModel:
+        name, version, mtime, size = self._describe(path)
+        model = joblib.load(path, mmap_mode=self.mmap_mode)
+        model.predict(_warmup_frame(model))  # pay first-call costs before serving
+        return RegisteredModel(name=name, version=version, path=path, mtime=mtime, size=size, model=model)
+
+    def reload(self) -> list:
+        """Load new/changed artifacts, drop removed ones; returns names (re)loaded."""
+        with self._reload_lock:
+            current = {m.path: m for m in self._models.values()}
+            models, changed = {}, []
+
+            for path in sorted(glob.glob(os.path.join(self.model_dir, "*.pkl"))):
+                old = current.get(path)
+                try:
+                    stat = os.stat(path)
+                    if old is not None and (old.mtime, old.size) == (stat.st_mtime, stat.st_size):
+                        models[old.name] = old
+                        continue
+                    entry = self._load(path)
+                except Exception as e:
+                    # half-copied or broken artifact: keep serving the old one
+                    print(f"⚠️ Could not load model {path}: {e}")
+                    if old is not None:
+                        models[old.name] = old
+                    continue
+                models[entry.name] = entry
+                changed.append(entry.name)
+
+            self._models = models  # atomic swap
+            return changed
+
+    # -----------------------
+    # Lookup
+    # -----------------------
+    def get(self, name: str = None) -> RegisteredModel:
+        models = self._models
+        name = name or self.default_name
+        if name not in models:
+            raise UnknownModelError(f"Unknown model '{name}'. Available: {sorted(models)}")
+        return models[name]
+
+    def list(self) -> list:
+        return [
+            {"name": m.name, "version": m.version, "path": os.path.basename(m.path)}
+            for m in self._models.values()
+        ]
+
+    # -----------------------
+    # Hot reload
+    # -----------------------
+    def start_watcher(self, interval: float = 10.0):
+        """Start the reload thread unless it is already running in this process."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        with self._watcher_lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            self._start_watcher(interval)
+
+    def _start_watcher(self, interval: float):
+        def _watch():
+            while True:
+                time.sleep(interval)
+                changed = self.reload()
+                if changed:
+                    print(f"🔄 Reloaded models: {', '.join(changed)}")
+
+        self._watcher = threading.Thread(target=_watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
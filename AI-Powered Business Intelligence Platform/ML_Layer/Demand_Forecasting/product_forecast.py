@@ -0,0 +1,194 @@
+# Product-level demand forecast (product_id x region, ~40k series)
+#
+# Same recursive forecast as the API's category x region one, scaled out:
+#   - only the last WINDOW rows of every series are read (window function over
+#     analytics.ml_daily_demand) plus each series' row count, straight into one
+#     SeriesState array (n_series x WINDOW floats, ~4.5 MB for 40k series)
+#   - series are cut into chunks of CHUNK_SERIES; each chunk runs the whole
+#     horizon in a worker process (one predict call per day per chunk), so
+#     peak memory is bounded by the chunk size, not the number of series
+#   - at most 2 x workers chunks are in flight; finished chunks are COPYed
+#     into a staging table as they arrive, which then replaces
+#     analytics.demand_forecast_product_15d (forecast_writer.write_swap)
+# The model is the product-level one from `python train.py --level product`
+# (saved_model/product/best_model.pkl), memory-mapped in every worker.
+#
+# python product_forecast.py [--horizon N] [--workers N] [--chunk N]
+#                            [--csv HISTORY.csv --out FORECAST.csv]   (offline run)
+
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BASE_DIR, "..", "..")))  # platform root: db.py, bulk_load.py
+
+import db
+from forecast_writer import drop_leftovers, write_swap
+from forecaster import WINDOW, SeriesState, forecast_state
+from train import PRODUCT_KEYS, PRODUCT_MODEL_DIR, PUBLISHED_STEM
+
+PRODUCT_MODEL_PATH = os.path.join(PRODUCT_MODEL_DIR, f"{PUBLISHED_STEM}.pkl")
+FORECAST_TABLE = "analytics.demand_forecast_product_15d"
+HORIZON = 15
+CHUNK_SERIES = int(os.getenv("PRODUCT_CHUNK_SERIES", "4000"))  # series per worker task
+FORECAST_WORKERS = int(os.getenv("PRODUCT_FORECAST_WORKERS", "0")) or (os.cpu_count() or 1)
+
+TAIL_SQL = """
+SELECT product_id, region, full_date AS date, daily_qty AS quantity, n_rows
+FROM (
+    SELECT product_id, region, full_date, daily_qty,
+           ROW_NUMBER() OVER (PARTITION BY product_id, region ORDER BY full_date DESC) AS rn,
+           COUNT(*) OVER (PARTITION BY product_id, region) AS n_rows
+    FROM analytics.ml_daily_demand
+) t
+WHERE rn <= %(window)s
+ORDER BY product_id, region, full_date;
+"""
+
+TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {FORECAST_TABLE} (
+    forecast_date DATE,
+    product_id BIGINT,
+    region TEXT,
+    predicted_quantity DOUBLE PRECISION,
+    model_name TEXT
+);
+"""
+
+
+# ---------- STATE ----------
+
+def _build_state(tail: pd.DataFrame, counts=None):
+    """(series keys, SeriesState) from each series' last rows, sorted by keys + date."""
+    tail = tail.sort_values(PRODUCT_KEYS + ["date"], kind="stable").reset_index(drop=True)
+    tail["product_id"] = tail["product_id"].astype(str)  # the model was fit on string keys
+    tail["region"] = tail["region"].astype(str)
+    series = tail.drop_duplicates(PRODUCT_KEYS)[PRODUCT_KEYS].reset_index(drop=True)
+    state = SeriesState.from_history(tail, PRODUCT_KEYS, counts=counts)
+    return series, state
+
+
+def load_state(engine=None):
+    """Series + state straight from Postgres (only WINDOW rows per series are read)."""
+    engine = engine or db.get_engine()
+    tail = db.read_arrow_frame(TAIL_SQL, {"window": WINDOW}, engine)
+    last_date = pd.Timestamp(tail["date"].max())
+    tail["date"] = pd.to_datetime(tail["date"]).astype("datetime64[ns]")
+    tail["quantity"] = tail["quantity"].astype("float64")
+    counts = tail.groupby(PRODUCT_KEYS, sort=True)["n_rows"].first().to_numpy(dtype=np.int64)
+    series, state = _build_state(tail, counts)
+    return series, state, last_date
+
+
+def state_from_frame(df: pd.DataFrame):
+    """Same as load_state for an in-memory history (date, product_id, region, quantity)."""
+    df = df.assign(date=pd.to_datetime(df["date"]).astype("datetime64[ns]"),
+                   quantity=pd.to_numeric(df["quantity"], errors="coerce").fillna(0.0))
+    series, state = _build_state(df)
+    return series, state, df["date"].max()
+
+
+# ---------- INFERENCE (worker side) ----------
+
+_model = None
+
+
+def _init_worker(model_path: str):
+    global _model
+    _model = joblib.load(model_path, mmap_mode="r")
+
+
+def _forecast_chunk(series: pd.DataFrame, state: SeriesState, future_dates) -> np.ndarray:
+    return forecast_state(series, state, _model, future_dates, PRODUCT_KEYS)
+
+
+def iter_chunk_forecasts(series: pd.DataFrame, state: SeriesState, future_dates,
+                         workers: int = FORECAST_WORKERS, chunk_series: int = CHUNK_SERIES,
+                         model_path: str = PRODUCT_MODEL_PATH):
+    """Yield (series chunk, predictions) in series order; <= 2 x workers chunks in flight."""
+    bounds = [(a, min(a + chunk_series, len(series))) for a in range(0, len(series), chunk_series)]
+
+    if workers <= 1:
+        _init_worker(model_path)
+        for a, b in bounds:
+            yield series.iloc[a:b], _forecast_chunk(series.iloc[a:b], state.subset(slice(a, b)), future_dates)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        pending = deque()
+        for a, b in bounds:
+            chunk = series.iloc[a:b]
+            pending.append((chunk, pool.submit(_forecast_chunk, chunk, state.subset(slice(a, b)), future_dates)))
+            if len(pending) >= 2 * workers:
+                chunk, fut = pending.popleft()
+                yield chunk, fut.result()
+        while pending:
+            chunk, fut = pending.popleft()
+            yield chunk, fut.result()
+
+
+def _rows(chunk: pd.DataFrame, preds: np.ndarray, future_dates, model_name: str) -> pd.DataFrame:
+    horizon = len(future_dates)
+    return pd.DataFrame({
+        "forecast_date": np.tile(np.array([d.date() for d in future_dates], dtype=object), len(chunk)),
+        "product_id": np.repeat(chunk["product_id"].astype(np.int64).to_numpy(), horizon),
+        "region": np.repeat(chunk["region"].to_numpy(), horizon),
+        "predicted_quantity": preds.ravel(),
+        "model_name": model_name,
+    })
+
+
+# ---------- RUN ----------
+
+def run_product_forecast(horizon: int = HORIZON, workers: int = FORECAST_WORKERS,
+                         chunk_series: int = CHUNK_SERIES, engine=None,
+                         history: pd.DataFrame = None, out_csv: str = None) -> dict:
+    """Forecast every product x region series and stream the rows to Postgres (or out_csv)."""
+    t0 = time.perf_counter()
+    with open(os.path.join(PRODUCT_MODEL_DIR, f"{PUBLISHED_STEM}.json"), encoding="utf-8") as f:
+        model_name = json.load(f).get("version", "product_model")
+
+    if history is not None:
+        series, state, last_date = state_from_frame(history)
+    else:
+        series, state, last_date = load_state(engine)
+    future_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=horizon, freq="D")
+    print(f"Product forecast: {len(series):,} series x {horizon} days, "
+          f"state loaded in {time.perf_counter() - t0:.1f}s")
+
+    chunks = iter_chunk_forecasts(series, state, future_dates, workers, chunk_series)
+    written = 0
+    if out_csv:
+        for i, (chunk, preds) in enumerate(chunks):
+            rows = _rows(chunk, preds, future_dates, model_name)
+            rows.to_csv(out_csv, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            written += len(rows)
+    else:
+        engine = engine or db.get_engine()
+        drop_leftovers(engine, FORECAST_TABLE)  # from earlier interrupted runs
+        rows = (_rows(chunk, preds, future_dates, model_name) for chunk, preds in chunks)
+        # drop the old table before returning: a daemon thread would die with the CLI
+        written = write_swap(engine, FORECAST_TABLE, rows, create_sql=TABLE_SQL, background_drop=False)
+
+    seconds = time.perf_counter() - t0
+    print(f"✅ {written:,} forecast rows written in {seconds:.1f}s -> {out_csv or FORECAST_TABLE}")
+    return {"series": len(series), "rows": written, "seconds": seconds, "model_name": model_name}
+
+
+def _arg(name: str, default):
+    return type(default)(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+
+if __name__ == "__main__":
+    history_df = pd.read_csv(sys.argv[sys.argv.index("--csv") + 1]) if "--csv" in sys.argv else None
+    run_product_forecast(horizon=_arg("--horizon", HORIZON), workers=_arg("--workers", FORECAST_WORKERS),
+                         chunk_series=_arg("--chunk", CHUNK_SERIES), history=history_df,
+                         out_csv=_arg("--out", ""))
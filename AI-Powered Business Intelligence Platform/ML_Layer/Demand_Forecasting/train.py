@@ -0,0 +1,221 @@
+# Scripted training for the category x region demand forecaster
+#
+# Same flow as model.ipynb (5 candidate models, last VAL_DAYS days held out,
+# best by MAE, refit on all rows), runnable from cron:
+#   - features come from features.py (row-based lags, as forecaster.py computes
+#     them at serving time) and are cached on disk between runs
+#     (FEATURE_CACHE_DIR, keyed by the data hash)
+#   - candidates are fitted in parallel in a process pool; models that support
+#     it get n_jobs = their share of the cores
+#   - output: saved_model/versions/<version>.pkl + <version>.json (metrics,
+#     leaderboard, timings), then published as best_model.pkl with a sidecar
+#     best_model.json the model registry reads {"name", "version"} from, so the
+#     running API hot-reloads it
+#   - --level product trains the product_id x region model product_forecast.py
+#     uses (saved_model/product/, outside the API registry). One-hot product ids
+#     make the design matrix sparse, so only the linear candidates run there.
+#
+# python train.py [--level product] [--csv PATH] [--days-back N] [--workers N] [--no-publish]
+#   (default source: warehouse via data_pre.fetch_forecasting_data / fetch_product_demand)
+
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import ElasticNet, Lasso, Ridge
+from sklearn.metrics import mean_absolute_error
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from features import FEATURE_VERSION, cached_training_frame, prepare_history
+from forecaster import CAT_COLS, NUM_COLS
+
+# =============================
+# CONFIG
+# =============================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "saved_model")
+PUBLISHED_STEM = "best_model"  # best_model.pkl is what the API serves
+MODEL_NAME = os.getenv("MODEL_NAME", "best_5_models_v1")
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", os.path.join(BASE_DIR, ".feature_cache"))
+
+PRODUCT_MODEL_DIR = os.path.join(MODEL_DIR, "product")
+PRODUCT_KEYS = ["product_id", "region"]
+PRODUCT_CANDIDATES = ["Ridge", "Lasso", "ElasticNet"]  # accept sparse input
+
+VAL_DAYS = 30
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", "0")) or min(5, os.cpu_count() or 1)
+
+
+# =============================
+# MODELS
+# =============================
+def candidate_models(n_jobs: int = -1) -> dict:
+    return {
+        "Ridge": Ridge(alpha=1.0, random_state=42),
+        "Lasso": Lasso(alpha=0.001, random_state=42, max_iter=5000),
+        "ElasticNet": ElasticNet(alpha=0.001, l1_ratio=0.5, random_state=42, max_iter=5000),
+        "RandomForest": RandomForestRegressor(
+            n_estimators=400, random_state=42, n_jobs=n_jobs, min_samples_leaf=2
+        ),
+        "HistGB": HistGradientBoostingRegressor(
+            random_state=42, max_depth=8, learning_rate=0.07, max_iter=400
+        ),
+    }
+
+
+def make_pipeline(model, cat_cols=CAT_COLS) -> Pipeline:
+    preprocess = ColumnTransformer(
+        transformers=[
+            ("cat", OneHotEncoder(handle_unknown="ignore"), list(cat_cols)),
+            ("num", Pipeline([("imputer", SimpleImputer(strategy="median"))]), NUM_COLS),
+        ]
+    )
+    return Pipeline([("prep", preprocess), ("model", model)])
+
+
+def _evaluate(name: str, model, train_df: pd.DataFrame, val_df: pd.DataFrame, keys=CAT_COLS) -> dict:
+    """Fit one candidate on the train split, score it on the validation days (runs in a worker)."""
+    cols = list(keys) + NUM_COLS
+    t0 = time.perf_counter()
+    pipe = make_pipeline(model, keys)
+    pipe.fit(train_df[cols], train_df["quantity"])
+    fit_seconds = time.perf_counter() - t0
+
+    pred = np.clip(pipe.predict(val_df[cols]), 0, None)  # demand can't be negative
+    return {
+        "model": name,
+        "val_MAE": float(mean_absolute_error(val_df["quantity"], pred)),
+        "fit_seconds": round(fit_seconds, 3),
+    }
+
+
+def evaluate_candidates(train_df: pd.DataFrame, val_df: pd.DataFrame, workers: int = TRAIN_WORKERS,
+                        keys=CAT_COLS, names: list = None) -> pd.DataFrame:
+    """Leaderboard of the candidates (lowest val_MAE first), fitted `workers` at a time."""
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)  # cores per candidate
+    models = candidate_models(n_jobs)
+    if names:
+        models = {name: models[name] for name in names}
+
+    if workers <= 1:
+        results = [_evaluate(name, model, train_df, val_df, keys) for name, model in models.items()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_evaluate, name, model, train_df, val_df, keys) for name, model in models.items()]
+            results = [f.result() for f in futures]
+
+    return pd.DataFrame(results).sort_values("val_MAE").reset_index(drop=True)
+
+
+# =============================
+# ARTIFACTS
+# =============================
+def save_artifact(pipe, meta: dict, publish: bool = True, model_dir: str = MODEL_DIR) -> str:
+    """Write the versioned artifact + metrics JSON; optionally publish it as best_model.pkl."""
+    versions_dir = os.path.join(model_dir, "versions")
+    os.makedirs(versions_dir, exist_ok=True)
+    version = meta["version"]
+    path = os.path.join(versions_dir, f"{version}.pkl")
+    joblib.dump(pipe, path)
+    with open(os.path.join(versions_dir, f"{version}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    if publish:
+        # sidecar first, then the model: the registry reloads on the .pkl mtime change
+        published = os.path.join(model_dir, PUBLISHED_STEM)
+        with open(published + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(published + ".json.tmp", published + ".json")
+        shutil.copyfile(path, published + ".pkl.tmp")
+        os.replace(published + ".pkl.tmp", published + ".pkl")  # atomic on the same filesystem
+    return path
+
+
+# =============================
+# TRAIN
+# =============================
+def train(df: pd.DataFrame, workers: int = TRAIN_WORKERS, publish: bool = True,
+          cache_dir: str = FEATURE_CACHE_DIR, level: str = "category") -> dict:
+    """Train + save the model for `level`: "category" (served by app.py) or "product"."""
+    if level == "product":
+        keys, names, model_dir, name = PRODUCT_KEYS, PRODUCT_CANDIDATES, PRODUCT_MODEL_DIR, f"{MODEL_NAME}_product"
+    else:
+        keys, names, model_dir, name = CAT_COLS, None, MODEL_DIR, MODEL_NAME
+    cols = keys + NUM_COLS
+
+    t0 = time.perf_counter()
+    history = prepare_history(df, keys)
+    feat, cache_hit = cached_training_frame(history, cache_dir, keys)
+    feature_seconds = time.perf_counter() - t0
+    print(f"Features: {len(feat):,} rows ({'cache hit' if cache_hit else 'built'}) in {feature_seconds:.2f}s")
+
+    # time split
+    val_start = feat["date"].max() - pd.Timedelta(days=VAL_DAYS - 1)
+    train_df = feat[feat["date"] < val_start]
+    val_df = feat[feat["date"] >= val_start]
+
+    leaderboard = evaluate_candidates(train_df, val_df, workers, keys, names)
+    print("Model leaderboard:")
+    print(leaderboard)
+    best_name = leaderboard.loc[0, "model"]
+    print("Best model:", best_name)
+
+    # retrain best on all rows (all cores for this one fit)
+    t1 = time.perf_counter()
+    best_pipe = make_pipeline(candidate_models(n_jobs=-1)[best_name], keys)
+    best_pipe.fit(feat[cols], feat["quantity"])
+    refit_seconds = time.perf_counter() - t1
+
+    trained_until = history["date"].max().date()
+    meta = {
+        "name": name,
+        "version": f"{name}@{datetime.now():%Y%m%dT%H%M%S}",
+        "level": level,
+        "best_model": best_name,
+        "val_days": VAL_DAYS,
+        "feature_columns": {"cat": keys, "num": NUM_COLS},
+        "feature_version": FEATURE_VERSION,
+        "leaderboard": leaderboard.to_dict(orient="records"),
+        "trained_until": str(trained_until),
+        "rows": {"history": len(history), "train": len(train_df), "val": len(val_df)},
+        "seconds": {
+            "features": round(feature_seconds, 3),
+            "refit": round(refit_seconds, 3),
+            "total": round(time.perf_counter() - t0, 3),
+        },
+        "feature_cache_hit": cache_hit,
+    }
+    path = save_artifact(best_pipe, meta, publish, model_dir)
+
+    print(f"✅ Saved model {meta['version']} -> {path}" + (" (published)" if publish else ""))
+    return meta
+
+
+def _load_source(argv, level: str) -> pd.DataFrame:
+    if "--csv" in argv:
+        return pd.read_csv(argv[argv.index("--csv") + 1])
+    from data_pre import fetch_forecasting_data, fetch_product_demand
+
+    days_back = int(argv[argv.index("--days-back") + 1]) if "--days-back" in argv else None
+    fetch = fetch_product_demand if level == "product" else fetch_forecasting_data
+    df = fetch(days_back=days_back)
+    if df is None or df.empty:
+        raise SystemExit("❌ No training data.")
+    return df
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else TRAIN_WORKERS
+    level = sys.argv[sys.argv.index("--level") + 1] if "--level" in sys.argv else "category"
+    train(_load_source(sys.argv, level), workers=workers, publish="--no-publish" not in sys.argv, level=level)
@@ -0,0 +1,173 @@
+# Bulk CSV loader for the raw layer (PostgreSQL + MySQL)
+#
+# Replaces df.to_sql(...) INSERTs:
+#   - PostgreSQL: the CSV file is streamed straight through COPY FROM STDIN
+#     (read in COPY_CHUNK_BYTES pieces, never parsed into a DataFrame)
+#   - MySQL: LOAD DATA LOCAL INFILE, falling back to batched parameterized
+#     executemany INSERTs when local infile is disabled on client or server
+# Column types are inferred from the first SAMPLE_ROWS rows only.
+
+import io
+import os
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+SAMPLE_ROWS = 10_000
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+MYSQL_BATCH_ROWS = 50_000
+
+PG_TYPES = {"int": "BIGINT", "float": "DOUBLE PRECISION", "bool": "BOOLEAN", "text": "TEXT"}
+MYSQL_TYPES = {"int": "BIGINT", "float": "DOUBLE", "bool": "BOOLEAN", "text": "TEXT"}
+
+
+@dataclass
+class LoadStats:
+    table: str
+    rows: int
+    seconds: float
+    method: str
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+    def __str__(self):
+        return (f"{self.table}: {self.rows:,} rows in {self.seconds:.2f}s "
+                f"({self.rows_per_sec:,.0f} rows/sec, {self.method})")
+
+
+# ---------- TYPE INFERENCE ----------
+
+def infer_column_types(csv_path: str, sample_rows: int = SAMPLE_ROWS) -> dict:
+    """Column -> 'int' | 'float' | 'bool' | 'text', from a sample of the file.
+
+    Dates stay text, like to_sql did; the staging layer parses them with TO_DATE.
+    """
+    sample = pd.read_csv(csv_path, nrows=sample_rows)
+    types = {}
+    for col, dtype in sample.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            types[col] = "bool"
+        elif pd.api.types.is_integer_dtype(dtype):
+            types[col] = "int"
+        elif pd.api.types.is_float_dtype(dtype):
+            types[col] = "float"
+        else:
+            types[col] = "text"
+    return types
+
+
+def _create_table_sql(qualified_name: str, types: dict, type_map: dict, quote: str) -> str:
+    cols = ", ".join(f"{quote}{col}{quote} {type_map[t]}" for col, t in types.items())
+    return f"CREATE TABLE IF NOT EXISTS {qualified_name} ({cols})"
+
+
+# ---------- POSTGRESQL ----------
+
+def copy_csv_to_postgres(engine, csv_path: str, table_name: str, schema: str = "raw",
+                         replace: bool = True) -> LoadStats:
+    """(Re)create schema.table_name from the CSV header/sample and COPY the file in."""
+    types = infer_column_types(csv_path)
+    qualified = f'{schema}."{table_name}"'
+    col_list = ", ".join(f'"{c}"' for c in types)
+
+    start = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        if replace:
+            cur.execute(f"DROP TABLE IF EXISTS {qualified}")
+        cur.execute(_create_table_sql(qualified, types, PG_TYPES, '"'))
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            cur.copy_expert(
+                f"COPY {qualified} ({col_list}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                f,
+                size=COPY_CHUNK_BYTES
+            )
+        rows = cur.rowcount
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    return LoadStats(table_name, rows, time.perf_counter() - start, "COPY")
+
+
+def copy_dataframe(cur, df: pd.DataFrame, qualified_table: str):
+    """COPY an in-memory DataFrame into an existing table on a psycopg2 cursor."""
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    col_list = ", ".join(f'"{c}"' for c in df.columns)
+    cur.copy_expert(f"COPY {qualified_table} ({col_list}) FROM STDIN WITH (FORMAT csv)", buf, size=COPY_CHUNK_BYTES)
+    return len(df)
+
+
+# ---------- MYSQL ----------
+
+def _line_terminator(csv_path: str) -> str:
+    """'\\r\\n' for files written on Windows (pandas uses os.linesep), else '\\n'."""
+    with open(csv_path, "rb") as f:
+        return "\\r\\n" if f.readline().endswith(b"\r\n") else "\\n"
+
+
+def _mysql_load_data(cur, csv_path: str, table_name: str, columns) -> int:
+    path = os.path.abspath(csv_path).replace("\\", "/").replace("'", "\\'")
+    col_list = ", ".join(f"`{c}`" for c in columns)
+    cur.execute(
+        f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE `{table_name}` "
+        f"CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+        f"LINES TERMINATED BY '{_line_terminator(csv_path)}' IGNORE 1 LINES ({col_list})"
+    )
+    return cur.rowcount
+
+
+def _mysql_executemany(cur, csv_path: str, table_name: str, columns) -> int:
+    col_list = ", ".join(f"`{c}`" for c in columns)
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO `{table_name}` ({col_list}) VALUES ({placeholders})"
+
+    rows = 0
+    for chunk in pd.read_csv(csv_path, chunksize=MYSQL_BATCH_ROWS):
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        cur.executemany(sql, list(chunk.itertuples(index=False, name=None)))
+        rows += len(chunk)
+    return rows
+
+
+def load_csv_to_mysql(engine, csv_path: str, table_name: str, replace: bool = True) -> LoadStats:
+    """(Re)create table_name and bulk-load the CSV (LOAD DATA, else executemany).
+
+    LOAD DATA LOCAL needs `connect_args={"allow_local_infile": True}` on the
+    engine and local_infile=ON on the server.
+    """
+    types = infer_column_types(csv_path)
+
+    start = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        if replace:
+            cur.execute(f"DROP TABLE IF EXISTS `{table_name}`")
+        cur.execute(_create_table_sql(f"`{table_name}`", types, MYSQL_TYPES, "`"))
+        try:
+            rows = _mysql_load_data(cur, csv_path, table_name, list(types))
+            method = "LOAD DATA LOCAL INFILE"
+        except Exception as e:
+            print(f"   ⚠️ LOAD DATA LOCAL INFILE unavailable ({e}); falling back to executemany.")
+            raw.rollback()
+            rows = _mysql_executemany(cur, csv_path, table_name, list(types))
+            method = "executemany"
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    return LoadStats(table_name, rows, time.perf_counter() - start, method)
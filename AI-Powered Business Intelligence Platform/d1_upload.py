@@ -0,0 +1,348 @@
+# Cloudflare D1 upload engine
+#
+# - multi-row parameterized INSERTs ("INSERT ... VALUES (?,?),(?,?)") built from
+#   whole-column conversions, no per-row SQL string formatting
+# - rows per statement sized to D1's limits (bound parameters per query,
+#   statement/payload size); a batch rejected as too big is split in half
+# - several requests in flight via asyncio (bounded by a semaphore); the sync
+#   client call runs in a worker thread
+# - transient failures are retried with exponential backoff. A timeout or
+#   dropped connection is ambiguous (D1 may have committed the batch), so
+#   writes are idempotent: every row carries its CSV row number in _row_id
+#   (UNIQUE) and is sent with INSERT OR IGNORE, and a resent batch adds nothing
+# - committed row ranges are checkpointed to disk, so a rerun resumes where
+#   the last one stopped instead of re-inserting everything; the checkpoint
+#   records the CSV's fingerprint (size + mtime) and is ignored once the file
+#   changes, so a regenerated dataset is uploaded in full (the table's rows
+#   are replaced, as with restart=True). Checkpoint writes run in worker
+#   threads, off the event loop
+#
+# SQLiteD1Client is a local stand-in for client.d1.database.raw (same call
+# shape, same limits) for testing without a Cloudflare account.
+
+import os
+import json
+import random
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+D1_MAX_BOUND_PARAMS = 100        # bound parameters per query
+D1_MAX_STATEMENT_BYTES = 100_000 # SQL statement length
+D1_MAX_PAYLOAD_BYTES = 1_000_000 # budget for one request body (sql + params)
+
+READ_CHUNK_ROWS = 50_000
+ROW_ID_COLUMN = "_row_id"  # CSV row number: the key that makes resends no-ops
+CHECKPOINT_DIR = "dataset/.d1_checkpoints"
+
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+TOO_LARGE_MARKERS = ("too many sql variables", "sqlite_toobig", "too big", "too large", "statement too long")
+
+
+class TransientD1Error(Exception):
+    """Retryable failure (network, rate limit, 5xx)."""
+
+
+def is_transient(e: Exception) -> bool:
+    return (isinstance(e, (TransientD1Error, ConnectionError, TimeoutError))
+            or type(e).__name__ in TRANSIENT_ERROR_NAMES)
+
+
+def is_too_large(e: Exception) -> bool:
+    msg = str(e).lower()
+    return any(marker in msg for marker in TOO_LARGE_MARKERS)
+
+
+def get_sqlite_type(dtype):
+    """Maps Pandas dtypes to SQLite types."""
+    if "int" in str(dtype):
+        return "INTEGER"
+    if "float" in str(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def safe_column_name(col_name: str) -> str:
+    return col_name.replace(" ", "_").replace("-", "_")
+
+
+def column_values(chunk: pd.DataFrame) -> list:
+    """Rows as tuples of Python natives (NaN -> None), converted column by column."""
+    cols = [chunk[c].astype(object).where(chunk[c].notna(), None).tolist() for c in chunk.columns]
+    return list(zip(*cols))
+
+
+def source_fingerprint(file_path: str) -> str:
+    """Size + mtime of the source CSV: changes when the dataset is regenerated."""
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+# ---------- CHECKPOINT ----------
+
+class UploadCheckpoint:
+    """Committed [start, end) row ranges of one CSV -> table upload.
+
+    Ranges saved for a different source fingerprint are discarded on load.
+    """
+
+    def __init__(self, path: str, source: str = None):
+        self.path = path
+        self.source = source
+        self.ranges = []
+        self.stale = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("source") == source:
+                self.ranges = [tuple(r) for r in saved["committed"]]
+            else:
+                self.stale = bool(saved["committed"])
+
+    @property
+    def committed_rows(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    def uncovered(self, start: int, end: int) -> list:
+        """Sub-ranges of [start, end) not committed yet."""
+        gaps, pos = [], start
+        for r_start, r_end in self.ranges:
+            if r_end <= pos or r_start >= end:
+                continue
+            if r_start > pos:
+                gaps.append((pos, r_start))
+            pos = max(pos, r_end)
+        if pos < end:
+            gaps.append((pos, end))
+        return gaps
+
+    def add(self, start: int, end: int):
+        with self._lock:
+            merged = []
+            for r in sorted(self.ranges + [(start, end)]):
+                if merged and r[0] <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], r[1]))
+                else:
+                    merged.append(r)
+            self.ranges = merged
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "committed": self.ranges}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        with self._lock:
+            self.ranges = []
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+# ---------- UPLOADER ----------
+
+class D1Uploader:
+    def __init__(self, client, account_id: str, database_id: str, concurrency: int = 8,
+                 max_retries: int = 5, backoff: float = 0.5, checkpoint_dir: str = CHECKPOINT_DIR,
+                 max_params: int = D1_MAX_BOUND_PARAMS):
+        self.client = client
+        self.account_id = account_id
+        self.database_id = database_id
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.checkpoint_dir = checkpoint_dir
+        self.max_params = max_params
+        self.row_cap = float("inf")  # lowered when D1 rejects a batch as too big
+
+    def _raw(self, sql: str, params: list = None):
+        kwargs = {"database_id": self.database_id, "account_id": self.account_id, "sql": sql}
+        if params:
+            kwargs["params"] = params
+        return self.client.d1.database.raw(**kwargs)
+
+    # ----- sizing -----
+    def rows_per_statement(self, sample: pd.DataFrame) -> int:
+        """Largest batch that fits the parameter and payload limits."""
+        n_cols = len(sample.columns) + 1  # + _row_id
+        by_params = max(1, self.max_params // n_cols)
+        avg_value_bytes = sum(pd.Series(sample[c].to_numpy(dtype=str)).str.len().mean() for c in sample.columns)
+        row_bytes = max(1, int(avg_value_bytes) + 4 * n_cols)
+        by_payload = max(1, D1_MAX_PAYLOAD_BYTES // row_bytes)
+        by_statement = max(1, (D1_MAX_STATEMENT_BYTES - 200) // (3 * n_cols + 3))
+        return min(by_params, by_payload, by_statement)
+
+    @staticmethod
+    def insert_sql(table_name: str, columns: list, n_rows: int) -> str:
+        """Idempotent multi-row INSERT; `columns` ends with _row_id."""
+        row = "(" + ", ".join(["?"] * len(columns)) + ")"
+        return (f"INSERT OR IGNORE INTO {table_name} ({', '.join(columns)}) VALUES "
+                + ", ".join([row] * n_rows) + ";")
+
+    async def _prepare_table(self, table_name: str, schema: str, replace: bool):
+        """Create the table (or add _row_id to an older one) with its unique row key."""
+        await asyncio.to_thread(self._raw, f"CREATE TABLE IF NOT EXISTS {table_name} ({schema});")
+        try:
+            await asyncio.to_thread(self._raw, f"ALTER TABLE {table_name} ADD COLUMN {ROW_ID_COLUMN} INTEGER;")
+        except Exception as e:
+            if "duplicate column" not in str(e).lower():
+                raise
+        if replace:
+            await asyncio.to_thread(self._raw, f"DELETE FROM {table_name};")
+        await asyncio.to_thread(
+            self._raw,
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_{ROW_ID_COLUMN} ON {table_name} ({ROW_ID_COLUMN});"
+        )
+
+    # ----- sending -----
+    async def _send(self, table_name, columns, rows, first_row, checkpoint):
+        attempt = 0
+        while True:
+            try:
+                sql = self.insert_sql(table_name, columns, len(rows))
+                params = [v for i, row in enumerate(rows) for v in (*row, first_row + i)]
+                await asyncio.to_thread(self._raw, sql, params)
+                await asyncio.to_thread(checkpoint.add, first_row, first_row + len(rows))
+                return len(rows)
+            except Exception as e:
+                if is_too_large(e) and len(rows) > 1:
+                    half = len(rows) // 2
+                    self.row_cap = min(self.row_cap, half)
+                    a = await self._send(table_name, columns, rows[:half], first_row, checkpoint)
+                    b = await self._send(table_name, columns, rows[half:], first_row + half, checkpoint)
+                    return a + b
+                if is_transient(e) and attempt < self.max_retries:
+                    delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                raise RuntimeError(f"rows {first_row}-{first_row + len(rows) - 1}: {e}") from e
+
+    async def upload_csv(self, file_path: str, table_name: str, restart: bool = False) -> dict:
+        sample = pd.read_csv(file_path, nrows=1_000)
+        columns = [safe_column_name(c) for c in sample.columns]
+
+        checkpoint = await asyncio.to_thread(
+            UploadCheckpoint, os.path.join(self.checkpoint_dir, f"{table_name}.json"), source_fingerprint(file_path)
+        )
+        if restart:
+            await asyncio.to_thread(checkpoint.clear)
+        if checkpoint.stale and not restart:
+            print(f"'{file_path}' changed since the last upload to '{table_name}': replacing its rows.")
+
+        # --- AUTOMATIC TABLE CREATION ---
+        schema = ", ".join(f"{c} {get_sqlite_type(t)}" for c, t in zip(columns, sample.dtypes))
+        schema += f", {ROW_ID_COLUMN} INTEGER"
+        print(f"Ensuring table '{table_name}' exists with schema...")
+        # old rows are keyed on the old file's row numbers: they must go
+        await self._prepare_table(table_name, schema, replace=restart or checkpoint.stale)
+        columns = columns + [ROW_ID_COLUMN]
+        if checkpoint.committed_rows:
+            print(f"Resuming '{table_name}': {checkpoint.committed_rows:,} rows already committed.")
+
+        batch_rows = self.rows_per_statement(sample)
+        sem = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        failure = None
+        sent = 0
+        start = time.perf_counter()
+
+        async def _bounded(rows, first_row):
+            try:
+                return await self._send(table_name, columns, rows, first_row, checkpoint)
+            finally:
+                sem.release()
+
+        def _done(task):
+            nonlocal failure, sent
+            pending.discard(task)
+            if task.exception() is not None:
+                failure = failure or task.exception()
+            else:
+                sent += task.result()
+
+        print(f"Starting upload to '{table_name}' ({batch_rows} rows/statement, {self.concurrency} in flight)...")
+        offset = 0
+        for chunk in pd.read_csv(file_path, chunksize=READ_CHUNK_ROWS):
+            chunk_rows = None
+            for gap_start, gap_end in checkpoint.uncovered(offset, offset + len(chunk)):
+                if chunk_rows is None:
+                    chunk_rows = column_values(chunk)
+                b = gap_start
+                while b < gap_end:
+                    await sem.acquire()
+                    if failure is not None:
+                        sem.release()
+                        break
+                    # batches shrink for good once D1 rejected one as too big
+                    b_end = min(b + min(batch_rows, self.row_cap), gap_end)
+                    task = asyncio.create_task(_bounded(chunk_rows[b - offset:b_end - offset], b))
+                    pending.add(task)
+                    task.add_done_callback(_done)
+                    b = b_end
+            offset += len(chunk)
+            if failure is not None:
+                break
+            print(f"Progress: {checkpoint.committed_rows:,} rows committed ({offset:,} read).")
+
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        elapsed = time.perf_counter() - start
+        if failure is not None:
+            print(f"Error uploading '{table_name}': {failure}. Progress checkpointed; rerun to resume.")
+            raise failure
+
+        print(f"✅ '{table_name}': {sent:,} rows uploaded in {elapsed:.1f}s "
+              f"({sent / elapsed if elapsed else 0:,.0f} rows/sec).")
+        return {"table": table_name, "rows": sent, "seconds": elapsed}
+
+
+# ---------- LOCAL STAND-IN ----------
+
+class SQLiteD1Client:
+    """Mimics client.d1.database.raw(...) on a local SQLite file, with D1's limits.
+
+    fail_rate injects TransientD1Error on that share of calls (retry testing).
+    """
+
+    def __init__(self, db_path: str = ":memory:", fail_rate: float = 0.0,
+                 max_params: int = D1_MAX_BOUND_PARAMS, latency: float = 0.0):
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.fail_rate = fail_rate
+        self.max_params = max_params
+        self.latency = latency
+        self.calls = 0
+        self.d1 = self
+        self.database = self
+
+    def raw(self, database_id=None, account_id=None, sql="", params=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise TransientD1Error("simulated 503 from D1")
+        params = params or []
+        if len(params) > self.max_params:
+            raise ValueError("too many SQL variables")
+        if len(sql.encode("utf-8")) > D1_MAX_STATEMENT_BYTES:
+            raise ValueError("SQLITE_TOOBIG: statement too long")
+
+        with self._lock:
+            if params:
+                cur = self._con.execute(sql, params)
+            else:
+                cur = self._con.executescript(sql)
+            self._con.commit()
+            return [{"results": {"columns": [], "rows": cur.fetchall()}, "success": True}]
+
+    def query(self, sql: str):
+        with self._lock:
+            return self._con.execute(sql).fetchall()
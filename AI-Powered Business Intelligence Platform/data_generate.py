@@ -3,8 +3,14 @@ import numpy as np
 from faker import Faker
 import random
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import os
+import shutil
 from tqdm import tqdm
 import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 fake = Faker()
 
@@ -14,6 +20,29 @@ N_PRODUCTS = 5_000
 N_VENDORS = 200
 N_WAREHOUSES = 10
 N_ORDERS = 1_000_000
+SEED = 42  # fixed seed -> same dataset on every run (None = fresh random data)
+
+# Sharded mode: orders and their dependent tables are generated in fixed-size
+# order-ID ranges, one ProcessPoolExecutor task per shard. The output depends
+# only on SEED and SHARD_SIZE, never on N_WORKERS.
+SHARDED = True
+SHARD_SIZE = 100_000
+N_WORKERS = os.cpu_count()
+
+# Streaming mode: each shard is written out as soon as it is generated
+# (CSV append + one Parquet part file per shard + optional DuckDB append), so
+# peak memory is ~N_WORKERS shards no matter how large N_ORDERS gets.
+STREAMING = False
+STREAM_TO_DUCKDB = True
+OUTPUT_DIR = "dataset"
+DUCKDB_PATH = "dataset/business_bi.duckdb"
+
+# Attribute pool: Faker is called POOL_SIZE times per attribute (once, then
+# cached on disk) and customers/vendors/products sample from the pool with
+# NumPy instead of calling Faker once per row.
+USE_ATTRIBUTE_POOL = True
+POOL_SIZE = 5_000
+POOL_CACHE_PATH = "dataset/.attribute_pool.npz"
 
 START_DATE = datetime(2023, 1, 1)
 END_DATE = datetime(2025, 12, 31)
@@ -21,15 +50,92 @@ END_DATE = datetime(2025, 12, 31)
 REGIONS = ["Dhaka", "Chattogram", "Sylhet", "Rajshahi", "Khulna", "Barishal", "Rangpur", "Mymensingh"]
 CATEGORIES = ["Rice", "Vegetables", "Fruits", "Fish", "Meat", "Spices", "Oil", "Dairy", "Snacks"]
 PAYMENT_METHODS = ["COD", "bKash", "Nagad", "Rocket", "Card", "Bank Transfer"]
+ORDER_STATUSES = ["Completed", "Cancelled", "Returned", "Pending"]
+SHIPMENT_STATUSES = ["Delivered", "In Transit", "Delayed"]
+MAX_ITEMS_PER_ORDER = 5
 
 # ---------- UTILS ----------
 
 def random_date(start, end):
     return start + timedelta(days=random.randint(0, (end - start).days))
 
+def random_dates(rng, n, start=START_DATE, end=END_DATE):
+    """Vectorized random_date: n dates drawn uniformly from [start, end]."""
+    offsets = rng.integers(0, (end - start).days + 1, size=n)
+    return pd.Timestamp(start) + pd.to_timedelta(offsets, unit="D")
+
+# ---------- ATTRIBUTE POOL ----------
+
+class AttributePool:
+    """Precomputed Faker values (names, emails, companies, words) sampled with NumPy."""
+
+    FIELDS = ("names", "email_users", "email_domains", "companies", "words")
+
+    def __init__(self, names, email_users, email_domains, companies, words):
+        self.names = np.asarray(names)
+        self.email_users = np.asarray(email_users)
+        self.email_domains = np.asarray(email_domains)
+        self.companies = np.asarray(companies)
+        self.words = np.asarray(words)
+
+    @classmethod
+    def build(cls, size=POOL_SIZE):
+        emails = [fake.email().split("@") for _ in range(size)]
+        return cls(
+            names=[fake.name() for _ in range(size)],
+            email_users=[user for user, _ in emails],
+            email_domains=[domain for _, domain in emails],
+            companies=[fake.company() for _ in range(size)],
+            words=[fake.word().capitalize() for _ in range(size)]
+        )
+
+    @classmethod
+    def load_or_build(cls, path=POOL_CACHE_PATH, size=POOL_SIZE, seed=SEED):
+        """Reuse the on-disk pool when it was built with the same size and seed.
+
+        seed=None means fresh random data, so the cache is neither read nor written.
+        """
+        if seed is None:
+            return cls.build(size)
+
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                if int(cached["size"]) == size and str(cached["seed"]) == str(seed):
+                    return cls(*(cached[f] for f in cls.FIELDS))
+
+        pool = cls.build(size)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, size=size, seed=str(seed), **{f: getattr(pool, f) for f in cls.FIELDS})
+        return pool
+
+    def sample(self, field, rng, n):
+        values = getattr(self, field)
+        return values[rng.integers(0, len(values), size=n)]
+
+    def unique_emails(self, rng, ids):
+        """Pool emails made unique by suffixing the row id to the user part."""
+        n = len(ids)
+        users = pd.Series(self.sample("email_users", rng, n))
+        domains = pd.Series(self.sample("email_domains", rng, n))
+        return (users + pd.Series(ids).astype(str) + "@" + domains).to_numpy()
+
 # ---------- GENERATORS ----------
+# generate_customers / generate_vendors / generate_products take an optional
+# AttributePool; with one they build the table column-wise from the pool.
+
+def generate_customers(n, pool=None, rng=None):
+    if pool is not None:
+        rng = rng if rng is not None else np.random.default_rng()
+        ids = np.arange(1, n + 1, dtype=np.int64)
+        return pd.DataFrame({
+            "customer_id": ids,
+            "name": pool.sample("names", rng, n),
+            "email": pool.unique_emails(rng, ids),
+            "phone": rng.integers(10**10, 10**11, size=n).astype(str),
+            "region": rng.choice(REGIONS, size=n),
+            "signup_date": random_dates(rng, n)
+        })
 
-def generate_customers(n):
     data = []
     for i in range(1, n+1):
         data.append({
@@ -42,7 +148,16 @@ def generate_customers(n):
         })
     return pd.DataFrame(data)
 
-def generate_vendors(n):
+def generate_vendors(n, pool=None, rng=None):
+    if pool is not None:
+        rng = rng if rng is not None else np.random.default_rng()
+        return pd.DataFrame({
+            "vendor_id": np.arange(1, n + 1, dtype=np.int64),
+            "company_name": pool.sample("companies", rng, n),
+            "region": rng.choice(REGIONS, size=n),
+            "rating": np.round(rng.uniform(3.0, 5.0, size=n), 2)
+        })
+
     data = []
     for i in range(1, n+1):
         data.append({
@@ -53,7 +168,19 @@ def generate_vendors(n):
         })
     return pd.DataFrame(data)
 
-def generate_products(n, vendors):
+def generate_products(n, vendors, pool=None, rng=None):
+    if pool is not None:
+        rng = rng if rng is not None else np.random.default_rng()
+        base_price = rng.integers(20, 801, size=n)
+        return pd.DataFrame({
+            "product_id": np.arange(1, n + 1, dtype=np.int64),
+            "product_name": pool.sample("words", rng, n),
+            "category": rng.choice(CATEGORIES, size=n),
+            "vendor_id": rng.choice(vendors["vendor_id"].to_numpy(), size=n),
+            "base_price": base_price,
+            "cost_price": np.round(base_price * rng.uniform(0.6, 0.85, size=n), 2)
+        })
+
     data = []
     for i in range(1, n+1):
         base_price = random.randint(20, 800)
@@ -89,56 +216,243 @@ def generate_inventory(products, warehouses):
             })
     return pd.DataFrame(data)
 
-def generate_orders(n, customers):
-    data = []
-    for i in tqdm(range(1, n+1)):
-        data.append({
-            "order_id": i,
-            "customer_id": random.choice(customers["customer_id"]),
-            "order_date": random_date(START_DATE, END_DATE),
-            "region": random.choice(REGIONS),
-            "payment_method": random.choice(PAYMENT_METHODS),
-            "status": random.choice(["Completed", "Cancelled", "Returned", "Pending"])
-        })
-    return pd.DataFrame(data)
-
-def generate_order_items(orders, products):
-    data = []
-    item_id = 1
-    for _, o in tqdm(orders.iterrows(), total=len(orders)):
-        for _ in range(random.randint(1, 5)):
-            p = products.sample(1).iloc[0]
-            qty = random.randint(1, 10)
-            data.append({
-                "order_item_id": item_id,
-                "order_id": o["order_id"],
-                "product_id": p["product_id"],
-                "quantity": qty,
-                "unit_price": p["base_price"],
-                "total_price": round(qty * p["base_price"], 2)
-            })
-            item_id += 1
-    return pd.DataFrame(data)
-
-def generate_payments(orders, order_items):
+# Orders, order items, payments and shipments are built column-wise with NumPy
+# (one vectorized draw per column instead of one Python call per row), so
+# 10M+ order datasets generate in minutes. Pass a np.random.Generator for
+# reproducible output.
+
+def generate_orders(n, customers, rng=None, start_id=1):
+    rng = rng if rng is not None else np.random.default_rng()
+    return pd.DataFrame({
+        "order_id": np.arange(start_id, start_id + n, dtype=np.int64),
+        "customer_id": rng.choice(customers["customer_id"].to_numpy(), size=n),
+        "order_date": random_dates(rng, n),
+        "region": rng.choice(REGIONS, size=n),
+        "payment_method": rng.choice(PAYMENT_METHODS, size=n),
+        "status": rng.choice(ORDER_STATUSES, size=n)
+    })
+
+def generate_order_items(orders, products, rng=None, start_id=1, items_per_order=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    if items_per_order is None:
+        items_per_order = rng.integers(1, MAX_ITEMS_PER_ORDER + 1, size=len(orders))
+    n_items = int(items_per_order.sum())
+
+    # Expand every order into its line items, then draw products in one go
+    order_ids = np.repeat(orders["order_id"].to_numpy(), items_per_order)
+    picks = rng.integers(0, len(products), size=n_items)
+    product_ids = products["product_id"].to_numpy()[picks]
+    unit_price = products["base_price"].to_numpy()[picks]
+    qty = rng.integers(1, 11, size=n_items)
+
+    return pd.DataFrame({
+        "order_item_id": np.arange(start_id, start_id + n_items, dtype=np.int64),
+        "order_id": order_ids,
+        "product_id": product_ids,
+        "quantity": qty,
+        "unit_price": unit_price,
+        "total_price": np.round(qty * unit_price, 2)
+    })
+
+def generate_payments(orders, order_items, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
     total_amount = order_items.groupby("order_id")["total_price"].sum().reset_index()
     df = orders.merge(total_amount, on="order_id", how="left")
     df["payment_status"] = np.where(df["status"] == "Completed", "Paid", "Unpaid")
-    df["payment_date"] = df["order_date"] + pd.to_timedelta(np.random.randint(0, 3, size=len(df)), unit="D")
+    df["payment_date"] = df["order_date"] + pd.to_timedelta(rng.integers(0, 3, size=len(df)), unit="D")
     return df[["order_id", "total_price", "payment_method", "payment_status", "payment_date"]]
 
-def generate_shipments(orders, warehouses):
-    data = []
-    for _, o in tqdm(orders.iterrows(), total=len(orders)):
-        ship_days = random.randint(1, 7)
-        data.append({
-            "order_id": o["order_id"],
-            "warehouse_id": random.choice(warehouses["warehouse_id"]),
-            "ship_date": o["order_date"] + timedelta(days=ship_days),
-            "delivery_date": o["order_date"] + timedelta(days=ship_days + random.randint(1, 3)),
-            "status": random.choice(["Delivered", "In Transit", "Delayed"])
-        })
-    return pd.DataFrame(data)
+def generate_shipments(orders, warehouses, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    n = len(orders)
+    ship_days = rng.integers(1, 8, size=n)
+    transit_days = rng.integers(1, 4, size=n)
+    order_date = orders["order_date"].to_numpy()
+    return pd.DataFrame({
+        "order_id": orders["order_id"].to_numpy(),
+        "warehouse_id": rng.choice(warehouses["warehouse_id"].to_numpy(), size=n),
+        "ship_date": order_date + pd.to_timedelta(ship_days, unit="D").to_numpy(),
+        "delivery_date": order_date + pd.to_timedelta(ship_days + transit_days, unit="D").to_numpy(),
+        "status": rng.choice(SHIPMENT_STATUSES, size=n)
+    })
+
+# ---------- SHARDED GENERATION ----------
+# Every shard gets two independent streams derived from the root seed and its
+# shard index: one for its item counts, one for everything else. Item counts
+# are cheap to draw, so the first order_item_id of any shard can be computed
+# without generating the shards before it -> IDs stay globally unique and
+# contiguous, and one shard can be regenerated on its own.
+
+def shard_ranges(n_orders, shard_size=SHARD_SIZE):
+    """(shard_idx, first_order_id, n_orders) for every shard."""
+    return [
+        (k, start + 1, min(shard_size, n_orders - start))
+        for k, start in enumerate(range(0, n_orders, shard_size))
+    ]
+
+def shard_rngs(entropy, shard_idx):
+    counts_seq = np.random.SeedSequence(entropy, spawn_key=(shard_idx, 0))
+    data_seq = np.random.SeedSequence(entropy, spawn_key=(shard_idx, 1))
+    return np.random.default_rng(counts_seq), np.random.default_rng(data_seq)
+
+def shard_item_counts(entropy, shard_idx, n):
+    counts_rng, _ = shard_rngs(entropy, shard_idx)
+    return counts_rng.integers(1, MAX_ITEMS_PER_ORDER + 1, size=n)
+
+def shard_item_start_ids(entropy, shards):
+    """First order_item_id of every shard, from the item-count streams only."""
+    totals = [int(shard_item_counts(entropy, k, n).sum()) for k, _, n in shards]
+    return np.concatenate([[1], np.cumsum(totals)[:-1] + 1]).astype(np.int64)
+
+def generate_shard(entropy, shard_idx, start_id, n, item_start_id, customers, products, warehouses):
+    """Orders, order_items, payments and shipments for one order-ID range."""
+    _, rng = shard_rngs(entropy, shard_idx)
+    orders = generate_orders(n, customers, rng, start_id=start_id)
+    order_items = generate_order_items(
+        orders, products, rng, start_id=item_start_id,
+        items_per_order=shard_item_counts(entropy, shard_idx, n)
+    )
+    payments = generate_payments(orders, order_items, rng)
+    shipments = generate_shipments(orders, warehouses, rng)
+    return orders, order_items, payments, shipments
+
+# Reference tables are sent to each worker once (pool initializer), not per task
+_shard_context = {}
+
+def _init_shard_worker(entropy, customers, products, warehouses):
+    _shard_context.update(
+        entropy=entropy, customers=customers, products=products, warehouses=warehouses
+    )
+
+def _run_shard(task):
+    shard_idx, start_id, n, item_start_id = task
+    ctx = _shard_context
+    return generate_shard(
+        ctx["entropy"], shard_idx, start_id, n, item_start_id,
+        ctx["customers"], ctx["products"], ctx["warehouses"]
+    )
+
+def generate_orders_sharded(n_orders, customers, products, warehouses, entropy,
+                            shard_size=SHARD_SIZE, n_workers=N_WORKERS):
+    shards = shard_ranges(n_orders, shard_size)
+    item_starts = shard_item_start_ids(entropy, shards)
+    tasks = [(k, start, n, int(item_starts[k])) for k, start, n in shards]
+
+    # Only the columns the order generators read are shipped to workers
+    customers = customers[["customer_id"]]
+    products = products[["product_id", "base_price"]]
+    warehouses = warehouses[["warehouse_id"]]
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_shard_worker,
+        initargs=(entropy, customers, products, warehouses)
+    ) as pool:
+        # map() yields in submission order, so concatenation is worker-count independent
+        results = list(tqdm(pool.map(_run_shard, tasks), total=len(tasks)))
+
+    return tuple(pd.concat(parts, ignore_index=True) for parts in zip(*results))
+
+# ---------- STREAMING ----------
+# Batches are whole shards, i.e. aligned on order boundaries: all line items of
+# an order land in the same batch as the order. generate_payments' groupby over
+# the batch's items is therefore the complete total for the batch's orders, so
+# payments aggregate incrementally batch by batch without the full order_items.
+
+def iter_order_batches(n_orders, customers, products, warehouses, entropy,
+                       shard_size=SHARD_SIZE, n_workers=N_WORKERS):
+    """Yield (orders, order_items, payments, shipments) per shard, in order.
+
+    At most n_workers shards are in flight at any time, which bounds memory.
+    """
+    shards = shard_ranges(n_orders, shard_size)
+    item_starts = shard_item_start_ids(entropy, shards)
+    tasks = [(k, start, n, int(item_starts[k])) for k, start, n in shards]
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_shard_worker,
+        initargs=(
+            entropy,
+            customers[["customer_id"]],
+            products[["product_id", "base_price"]],
+            warehouses[["warehouse_id"]]
+        )
+    ) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_run_shard, task))
+            if len(pending) >= n_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class DatasetSink:
+    """Appends DataFrame batches to CSV, a per-table Parquet dataset and DuckDB.
+
+    Parquet output is one directory per table with one part file (= one row
+    group) per batch: dataset/parquet/<table>/part-00000.parquet, ...
+    """
+
+    def __init__(self, out_dir=OUTPUT_DIR, duckdb_path=None):
+        self.out_dir = out_dir
+        self.parts = {}
+        self.con = duckdb.connect(duckdb_path) if duckdb_path else None
+
+    def write(self, table_name, df):
+        part = self.parts.get(table_name, 0)
+        parquet_dir = os.path.join(self.out_dir, "parquet", table_name)
+        if part == 0:
+            shutil.rmtree(parquet_dir, ignore_errors=True)
+            os.makedirs(parquet_dir, exist_ok=True)
+
+        df.to_csv(
+            os.path.join(self.out_dir, f"{table_name}.csv"),
+            mode="w" if part == 0 else "a", header=part == 0, index=False
+        )
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            os.path.join(parquet_dir, f"part-{part:05d}.parquet")
+        )
+        if self.con is not None:
+            if part == 0:
+                self.con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM df")
+            else:
+                self.con.execute(f"INSERT INTO {table_name} SELECT * FROM df")
+
+        self.parts[table_name] = part + 1
+
+    def close(self):
+        if self.con is not None:
+            self.con.close()
+
+def stream_dataset(reference_tables, entropy):
+    """Streaming counterpart of the batch save path in main()."""
+    sink = DatasetSink(OUTPUT_DIR, DUCKDB_PATH if STREAM_TO_DUCKDB else None)
+    try:
+        for table_name, df in reference_tables.items():
+            sink.write(table_name, df)
+            print(f"  - Table '{table_name}' stored.")
+
+        print(f"Streaming orders, order items, payments and shipments "
+              f"({SHARD_SIZE:,} orders/batch, {N_WORKERS} workers)...")
+        batches = iter_order_batches(
+            N_ORDERS,
+            reference_tables["customers"],
+            reference_tables["products"],
+            reference_tables["warehouses"],
+            entropy,
+            shard_size=SHARD_SIZE,
+            n_workers=N_WORKERS
+        )
+        n_batches = len(shard_ranges(N_ORDERS, SHARD_SIZE))
+        for orders, order_items, payments, shipments in tqdm(batches, total=n_batches):
+            sink.write("orders", orders)
+            sink.write("order_items", order_items)
+            sink.write("payments", payments)
+            sink.write("shipments", shipments)
+    finally:
+        sink.close()
 
 def generate_pricing_history(products):
     data = []
@@ -171,14 +485,27 @@ def generate_marketing_campaigns():
 # ---------- PIPELINE ----------
 
 def main():
+    # Seed every random source so a run is fully reproducible
+    random.seed(SEED)
+    np.random.seed(SEED)
+    Faker.seed(SEED)
+    rng = np.random.default_rng(SEED)
+
+    pool, pool_rng = None, None
+    if USE_ATTRIBUTE_POOL:
+        print("Loading attribute pool...")
+        pool = AttributePool.load_or_build(POOL_CACHE_PATH, POOL_SIZE, SEED)
+        # Own stream, so pool sampling never shifts the order generators' draws
+        pool_rng = np.random.default_rng(np.random.SeedSequence(SEED).spawn(1)[0])
+
     print("Generating customers...")
-    customers = generate_customers(N_CUSTOMERS)
+    customers = generate_customers(N_CUSTOMERS, pool, pool_rng)
 
     print("Generating vendors...")
-    vendors = generate_vendors(N_VENDORS)
+    vendors = generate_vendors(N_VENDORS, pool, pool_rng)
 
     print("Generating products...")
-    products = generate_products(N_PRODUCTS, vendors)
+    products = generate_products(N_PRODUCTS, vendors, pool, pool_rng)
 
     print("Generating warehouses...")
     warehouses = generate_warehouses(N_WAREHOUSES)
@@ -186,24 +513,46 @@ def main():
     print("Generating inventory...")
     inventory = generate_inventory(products, warehouses)
 
-    print("Generating orders...")
-    orders = generate_orders(N_ORDERS, customers)
-
-    print("Generating order items...")
-    order_items = generate_order_items(orders, products)
-
-    print("Generating payments...")
-    payments = generate_payments(orders, order_items)
-
-    print("Generating shipments...")
-    shipments = generate_shipments(orders, warehouses)
-
     print("Generating pricing history...")
     pricing_history = generate_pricing_history(products)
 
     print("Generating marketing campaigns...")
     campaigns = generate_marketing_campaigns()
 
+    if STREAMING:
+        stream_dataset({
+            "customers": customers,
+            "vendors": vendors,
+            "products": products,
+            "warehouses": warehouses,
+            "inventory": inventory,
+            "pricing_history": pricing_history,
+            "marketing_campaigns": campaigns
+        }, np.random.SeedSequence(SEED).entropy)
+        print("✅ Enterprise synthetic data streamed to CSV, Parquet and DuckDB.")
+        return
+
+    if SHARDED:
+        entropy = np.random.SeedSequence(SEED).entropy
+        print(f"Generating orders, order items, payments and shipments "
+              f"({SHARD_SIZE:,} orders/shard, {N_WORKERS} workers)...")
+        orders, order_items, payments, shipments = generate_orders_sharded(
+            N_ORDERS, customers, products, warehouses, entropy,
+            shard_size=SHARD_SIZE, n_workers=N_WORKERS
+        )
+    else:
+        print("Generating orders...")
+        orders = generate_orders(N_ORDERS, customers, rng)
+
+        print("Generating order items...")
+        order_items = generate_order_items(orders, products, rng)
+
+        print("Generating payments...")
+        payments = generate_payments(orders, order_items, rng)
+
+        print("Generating shipments...")
+        shipments = generate_shipments(orders, warehouses, rng)
+
     print("Saving CSV files...")
     customers.to_csv("dataset/customers.csv", index=False)
     vendors.to_csv("dataset/vendors.csv", index=False)
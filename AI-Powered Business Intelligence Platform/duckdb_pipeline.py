@@ -0,0 +1,162 @@
+# DuckDB backend for the warehouse build
+#
+# Runs the same pg_query/*.sql scripts (raw -> staging -> star schema -> KPIs
+# -> ML views) in-process on DuckDB, no Postgres server needed:
+#   - raw.<table> are views over the tables data_generate.py wrote to
+#     dataset/business_bi.duckdb (attached read-only) or over the Parquet
+#     datasets in dataset/parquet/<table>/
+#   - a small dialect shim rewrites the Postgres-only bits the scripts use
+#     (TO_DATE, TO_CHAR, generate_series, materialized views, partitioning,
+#     DO blocks, indexes); everything else is plain SQL both engines accept
+#   - the result is written to TARGET_PATH with the same schemas/table names,
+#     so the analytics tables can be inspected or compared to Postgres
+#
+# python duckdb_pipeline.py [--parquet]
+
+import os
+import re
+import sys
+import time
+
+import duckdb
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pg_query")
+SOURCE_DUCKDB = "dataset/business_bi.duckdb"
+SOURCE_PARQUET_DIR = "dataset/parquet"
+TARGET_PATH = "dataset/bi_warehouse.duckdb"  # file stem becomes the catalog name: must not be a schema name
+
+# Build order; same files the Postgres build runs with psql
+LAYER_SCRIPTS = ["raw_query.sql", "staging_query.sql", "warehouse_query.sql", "analytics.sql", "ML_query.sql"]
+
+SOURCE_TABLES = [
+    "customers", "vendors", "products", "warehouses", "inventory", "orders",
+    "order_items", "payments", "shipments", "pricing_history", "marketing_campaigns",
+]
+
+
+# ---------- DIALECT SHIM ----------
+
+PG_DATE_FORMATS = {"YYYYMMDD": "%Y%m%d", "YYYY-MM-DD": "%Y-%m-%d"}
+
+DIALECT_RULES = [
+    # DO $$ ... $$; blocks (plpgsql) -> dropped, checks run from Python instead
+    (re.compile(r"DO\s+\$\$.*?\$\$\s*;", re.S | re.I), ""),
+    # CREATE INDEX ... -> dropped (DuckDB scans columnar segments with zone maps)
+    (re.compile(r"CREATE\s+INDEX[^;]*;", re.I), ""),
+    # TO_DATE(x, 'YYYY-MM-DD') -> CAST(x AS DATE) (raw dates are text or timestamps)
+    (re.compile(r"TO_DATE\(\s*([^,()]+?)\s*,\s*'YYYY-MM-DD'\s*\)", re.I), r"CAST(\1 AS DATE)"),
+    # TO_CHAR(d, 'Day') -> dayname(d)
+    (re.compile(r"TO_CHAR\(\s*([^,()]+?)\s*,\s*'Day'\s*\)", re.I), r"dayname(\1)"),
+    # TO_CHAR(d, 'YYYYMMDD') -> strftime(d, '%Y%m%d')
+    (re.compile(r"TO_CHAR\(\s*([^,()]+?)\s*,\s*'(YYYYMMDD|YYYY-MM-DD)'\s*\)", re.I),
+     lambda m: f"strftime({m.group(1)}, '{PG_DATE_FORMATS[m.group(2).upper()]}')"),
+    # generate_series(a, b, '1 day') AS d -> table alias with a named column
+    (re.compile(r"generate_series\(([^;]*?),\s*'1 day'\s*\)\s+AS\s+(\w+)", re.I),
+     r"generate_series(\1, INTERVAL 1 DAY) AS g(\2)"),
+    # declarative partitioning -> one plain table
+    (re.compile(r"CREATE\s+TABLE[^;]*?PARTITION\s+OF[^;]*;", re.I), ""),
+    (re.compile(r"\)\s*PARTITION\s+BY\s+RANGE\s*\([^)]*\)", re.I), ")"),
+    # materialized views -> plain tables
+    (re.compile(r"CREATE\s+MATERIALIZED\s+VIEW", re.I), "CREATE TABLE"),
+]
+
+
+def translate(sql: str) -> str:
+    """Postgres script -> DuckDB script."""
+    for pattern, repl in DIALECT_RULES:
+        sql = pattern.sub(repl, sql)
+    return sql
+
+
+def split_statements(sql: str) -> list:
+    """Statements of a script (line comments stripped; scripts have no ';' inside literals)."""
+    sql = re.sub(r"--[^\n]*", "", sql)
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+
+# ---------- SOURCES ----------
+
+def attach_raw(con, use_parquet: bool = False):
+    """raw.<table> views over the generated DuckDB file or Parquet datasets."""
+    con.execute("CREATE SCHEMA IF NOT EXISTS raw")
+    if use_parquet:
+        for table in SOURCE_TABLES:
+            path = os.path.join(SOURCE_PARQUET_DIR, table, "*.parquet").replace("\\", "/")
+            con.execute(f"CREATE OR REPLACE VIEW raw.{table} AS SELECT * FROM read_parquet('{path}')")
+        return
+    con.execute(f"ATTACH '{SOURCE_DUCKDB}' AS source (READ_ONLY)")
+    for table in SOURCE_TABLES:
+        con.execute(f"CREATE OR REPLACE VIEW raw.{table} AS SELECT * FROM source.main.{table}")
+
+
+# ---------- CHECKS ----------
+
+# Postgres runs these as DO blocks inside the scripts
+CHECKS = {
+    "inventory_kpis totals": """
+        SELECT
+            (SELECT SUM(total_stock) FROM analytics.inventory_kpis)
+              = (SELECT SUM(stock_qty) FROM warehouse.fact_inventory fi
+                 WHERE fi.product_id IN (SELECT product_id FROM warehouse.dim_product))
+            AND
+            (SELECT COALESCE(SUM(total_sold), 0) FROM analytics.inventory_kpis)
+              = (SELECT COALESCE(SUM(quantity), 0) FROM warehouse.fact_sales
+                 WHERE product_id IN (SELECT fi.product_id FROM warehouse.fact_inventory fi
+                                      JOIN warehouse.dim_product dp ON dp.product_id = fi.product_id))
+    """,
+}
+
+
+def run_checks(con) -> dict:
+    results = {}
+    for name, sql in CHECKS.items():
+        results[name] = bool(con.execute(sql).fetchone()[0])
+        print(f"   {'✔️' if results[name] else '❌'} {name}")
+    return results
+
+
+# ---------- BUILD ----------
+
+def build(target_path: str = TARGET_PATH, use_parquet: bool = False, threads: int = None) -> dict:
+    """Fresh raw -> staging -> warehouse -> analytics build in target_path."""
+    if target_path != ":memory:" and os.path.exists(target_path):
+        os.remove(target_path)
+    con = duckdb.connect(target_path)
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+
+    timings = {}
+    start = time.perf_counter()
+    try:
+        attach_raw(con, use_parquet)
+        for script in LAYER_SCRIPTS:
+            with open(os.path.join(SQL_DIR, script), encoding="utf-8") as f:
+                statements = split_statements(translate(f.read()))
+            t0 = time.perf_counter()
+            for stmt in statements:
+                try:
+                    con.execute(stmt)
+                except duckdb.Error as e:
+                    raise RuntimeError(f"{script}: {e}\n--- statement ---\n{stmt}") from e
+            timings[script] = time.perf_counter() - t0
+            print(f"   ✔️ {script}: {len(statements)} statements in {timings[script]:.2f}s")
+
+        checks = run_checks(con)
+        counts = {
+            f"{schema}.{name}": con.execute(f"SELECT COUNT(*) FROM {schema}.{name}").fetchone()[0]
+            for schema, name in con.execute(
+                "SELECT table_schema, table_name FROM information_schema.tables "
+                "WHERE table_catalog = current_database() AND table_type = 'BASE TABLE' "
+                "AND table_schema IN ('staging', 'warehouse', 'analytics') ORDER BY 1, 2"
+            ).fetchall()
+        }
+    finally:
+        con.close()
+
+    total = time.perf_counter() - start
+    print(f"✅ DuckDB warehouse built in {total:.2f}s -> {target_path}")
+    return {"seconds": total, "timings": timings, "checks": checks, "row_counts": counts}
+
+
+if __name__ == "__main__":
+    build(use_parquet="--parquet" in sys.argv)
@@ -0,0 +1,197 @@
+# ML feature store: incremental refresh of the analytics.ml_* tables
+#
+# pg_query/ML_query.sql builds the feature tables in full (indexed tables,
+# not views). This refreshes them for the dates that changed:
+#   - the start date comes from the incremental refresh log
+#     (etl.fact_sales_changes, batches after this store's watermark), or is
+#     given explicitly
+#   - ml_daily_demand / ml_daily_payments: rows from that date on are deleted
+#     and re-aggregated from the facts, filtered on date_id (partition pruning)
+#   - ml_daily_demand_category_region: re-aggregated from ml_daily_demand for
+#     the same dates
+#   - ml_demand_features: lags/rolling mean are by row within each series, so
+#     rows from the start date on are recomputed with the windows running over
+#     the whole (small, pre-aggregated) category/region table
+#   - ml_inventory is a snapshot and is rebuilt (a few thousand rows)
+# One transaction per refresh; readers never see a half-refreshed range.
+# Every refresh (scheduled or --from) is logged in etl.feature_refreshes with
+# its start date, so consumers of these tables (the forecasting API's local
+# history store) know from which date to re-read.
+#
+# python feature_store.py [--from YYYY-MM-DD] [--every SECONDS]
+
+import sys
+import time
+from datetime import date
+
+from db import get_engine
+
+WATERMARK = "feature_store"
+
+REFRESH_LOG_SQL = """
+CREATE SCHEMA IF NOT EXISTS etl;
+CREATE TABLE IF NOT EXISTS etl.feature_refreshes (
+    refresh_id BIGSERIAL PRIMARY KEY,
+    start_date DATE NOT NULL,
+    finished_at TIMESTAMPTZ DEFAULT now()
+);
+"""
+
+REFRESH_SQL = [
+    """
+    DELETE FROM analytics.ml_daily_demand WHERE full_date >= %(start)s;
+    INSERT INTO analytics.ml_daily_demand
+    SELECT d.full_date, f.product_id, c.region,
+           SUM(f.quantity), SUM(f.revenue), AVG(p.base_price), AVG(p.cost_price)
+    FROM warehouse.fact_sales f
+    JOIN warehouse.dim_date d      ON f.date_id = d.date_id
+    JOIN warehouse.dim_customer c  ON f.customer_id = c.customer_id
+    JOIN warehouse.dim_product p   ON f.product_id = p.product_id
+    WHERE f.date_id >= %(start_id)s
+    GROUP BY d.full_date, f.product_id, c.region;
+    """,
+    """
+    DELETE FROM analytics.ml_daily_payments WHERE full_date >= %(start)s;
+    INSERT INTO analytics.ml_daily_payments
+    SELECT d.full_date, SUM(fp.amount_paid)
+    FROM warehouse.fact_payments fp
+    JOIN warehouse.dim_date d ON fp.date_id = d.date_id
+    WHERE fp.date_id >= %(start_id)s
+    GROUP BY d.full_date;
+    """,
+    """
+    DELETE FROM analytics.ml_daily_demand_category_region WHERE date >= %(start)s;
+    INSERT INTO analytics.ml_daily_demand_category_region
+    SELECT m.full_date, p.category, m.region, SUM(m.daily_qty)
+    FROM analytics.ml_daily_demand m
+    JOIN warehouse.dim_product p ON m.product_id = p.product_id
+    WHERE m.full_date >= %(start)s
+    GROUP BY m.full_date, p.category, m.region;
+    """,
+    """
+    DELETE FROM analytics.ml_demand_features WHERE date >= %(start)s;
+    INSERT INTO analytics.ml_demand_features
+    SELECT * FROM (
+        SELECT
+          date, category, region, quantity,
+          (EXTRACT(ISODOW FROM date)::INT - 1) AS dow,
+          EXTRACT(MONTH FROM date)::INT AS month,
+          CASE WHEN EXTRACT(ISODOW FROM date) >= 6 THEN 1 ELSE 0 END AS is_weekend,
+          LAG(quantity, 1) OVER w AS lag_1,
+          LAG(quantity, 7) OVER w AS lag_7,
+          LAG(quantity, 14) OVER w AS lag_14,
+          CASE WHEN COUNT(quantity) OVER w7 = 7 THEN AVG(quantity) OVER w7 END AS rollmean_7
+        FROM analytics.ml_daily_demand_category_region
+        WINDOW
+          w AS (PARTITION BY category, region ORDER BY date),
+          w7 AS (PARTITION BY category, region ORDER BY date ROWS BETWEEN 7 PRECEDING AND 1 PRECEDING)
+    ) x
+    WHERE date >= %(start)s;
+    """,
+    """
+    TRUNCATE analytics.ml_inventory;
+    INSERT INTO analytics.ml_inventory
+    SELECT fi.product_id, dw.region, SUM(fi.stock_qty)
+    FROM warehouse.fact_inventory fi
+    JOIN warehouse.dim_warehouse dw ON fi.warehouse_id = dw.warehouse_id
+    GROUP BY fi.product_id, dw.region;
+    """,
+]
+
+FEATURE_TABLES = {  # table -> date column (None = snapshot)
+    "ml_daily_demand": "full_date",
+    "ml_daily_payments": "full_date",
+    "ml_daily_demand_category_region": "date",
+    "ml_demand_features": "date",
+    "ml_inventory": None,
+}
+
+
+def pending_start(cur, watermark: str = WATERMARK):
+    """(earliest date touched by refresh batches after `watermark`, last batch id)."""
+    cur.execute("SELECT to_regclass('etl.refresh_batches') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return None, None  # incremental_refresh.py never ran
+    cur.execute("SELECT COALESCE(MAX(batch_id), 0) FROM etl.refresh_batches WHERE finished_at IS NOT NULL")
+    to_batch = cur.fetchone()[0]
+    cur.execute("SELECT last_id FROM etl.watermarks WHERE source_table = %s", (watermark,))
+    row = cur.fetchone()
+    from_batch = row[0] if row else 0
+
+    cur.execute(
+        "SELECT MIN(date_id) FROM etl.fact_sales_changes WHERE batch_id > %s AND batch_id <= %s",
+        (from_batch, to_batch)
+    )
+    min_id = cur.fetchone()[0]
+    start = date(min_id // 10_000, min_id // 100 % 100, min_id % 100) if min_id else None
+    return start, to_batch
+
+
+def refresh(engine=None, start: date = None) -> dict:
+    """Refresh all feature tables from `start` (default: from the pending change log)."""
+    engine = engine or get_engine()
+    t0 = time.perf_counter()
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        to_batch = None
+        if start is None:
+            start, to_batch = pending_start(cur)
+        if start is None:
+            print("✔️ Feature store up to date.")
+            raw.rollback()
+            return {"start": None, "rows": {}}
+
+        params = {"start": start, "start_id": start.year * 10_000 + start.month * 100 + start.day}
+        for sql in REFRESH_SQL:
+            cur.execute(sql, params)
+        cur.execute(REFRESH_LOG_SQL)
+        cur.execute("INSERT INTO etl.feature_refreshes (start_date) VALUES (%(start)s)", params)
+
+        if to_batch is not None:
+            cur.execute(
+                """
+                INSERT INTO etl.watermarks (source_table, last_id, updated_at)
+                VALUES (%s, %s, now())
+                ON CONFLICT (source_table) DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = now()
+                """,
+                (WATERMARK, to_batch)
+            )
+
+        rows = {}
+        for table, date_col in FEATURE_TABLES.items():
+            where = f"WHERE {date_col} >= %(start)s" if date_col else ""
+            cur.execute(f"SELECT COUNT(*) FROM analytics.{table} {where}", params)
+            rows[table] = cur.fetchone()[0]
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    seconds = time.perf_counter() - t0
+    print(f"✅ Feature store refreshed from {start} in {seconds:.2f}s: {rows}")
+    return {"start": start.isoformat(), "rows": rows, "seconds": seconds}
+
+
+def run_scheduled(interval: float, engine=None):
+    """Refresh every `interval` seconds (picks up whatever the incremental refresh logged)."""
+    engine = engine or get_engine()
+    while True:
+        try:
+            refresh(engine)
+        except Exception as e:
+            print(f"❌ Feature store refresh failed: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    start_arg = None
+    if "--from" in sys.argv:
+        start_arg = date.fromisoformat(sys.argv[sys.argv.index("--from") + 1])
+    if "--every" in sys.argv:
+        run_scheduled(float(sys.argv[sys.argv.index("--every") + 1]))
+    else:
+        refresh(start=start_arg)
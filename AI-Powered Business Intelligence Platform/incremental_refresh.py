@@ -0,0 +1,387 @@
+# Incremental raw -> staging -> warehouse refresh
+#
+# The full build (warehouse.py + pg_query/*.sql) recreates every table; this
+# script is the nightly alternative and only moves the delta:
+#   - high-water marks per source table live in etl.watermarks
+#     (last id for every table, last order_date for orders)
+#   - dimensions (customers, vendors, products, warehouses) are append-only:
+#     rows with an id above the mark are added, existing rows are left alone
+#   - orders and their child tables (order_items, payments, shipments) are
+#     merged per order: new orders (order_id above the mark) plus orders inside
+#     the last RECHECK_DAYS days whose rows differ from what raw already has
+#     (status updates, late payments/shipments). Those order ids are deleted
+#     and re-inserted in raw, staging and the fact tables
+#   - the fact rows replaced are logged under a batch id as signed deltas
+#     (old rows with sign -1, new rows with +1) in etl.fact_sales_changes and
+#     etl.fact_shipments_changes; kpi_maintenance.py merges them into the
+#     analytics KPI tables
+# Everything runs in one transaction, watermarks included, so a failed run
+# leaves the previous state intact and can simply be rerun.
+#
+# The first run needs a full build to exist; its marks are taken from raw.
+
+import os
+import time
+
+import pandas as pd
+from bulk_load import copy_dataframe
+from db import get_engine
+from partition_manager import ensure_partitions, is_partitioned
+
+SOURCE_DIR = "dataset"
+RECHECK_DAYS = 7          # orders this recent are compared against raw for changes
+READ_CHUNK_ROWS = 500_000
+
+DIMENSIONS = {            # source table -> id column (append-only)
+    "vendors": "vendor_id",
+    "customers": "customer_id",
+    "warehouses": "warehouse_id",
+    "products": "product_id",
+}
+ORDER_TABLES = ["orders", "order_items", "payments", "shipments"]
+
+SETUP_SQL = """
+CREATE SCHEMA IF NOT EXISTS etl;
+
+CREATE TABLE IF NOT EXISTS etl.watermarks (
+    source_table TEXT PRIMARY KEY,
+    last_id BIGINT,
+    last_date DATE,
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS etl.refresh_batches (
+    batch_id BIGSERIAL PRIMARY KEY,
+    started_at TIMESTAMPTZ DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    new_orders INT,
+    changed_orders INT
+);
+
+CREATE TABLE IF NOT EXISTS etl.fact_sales_changes (
+    batch_id BIGINT,
+    sign SMALLINT,
+    order_id BIGINT,
+    date_id INT,
+    customer_id BIGINT,
+    product_id BIGINT,
+    quantity BIGINT,
+    revenue DOUBLE PRECISION,
+    profit DOUBLE PRECISION
+);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_changes_batch ON etl.fact_sales_changes(batch_id);
+
+CREATE TABLE IF NOT EXISTS etl.fact_shipments_changes (
+    batch_id BIGINT,
+    sign SMALLINT,
+    order_id BIGINT,
+    warehouse_id BIGINT,
+    days_to_deliver INT
+);
+CREATE INDEX IF NOT EXISTS idx_fact_shipments_changes_batch ON etl.fact_shipments_changes(batch_id);
+
+-- per-order merges delete by order_id at every layer
+CREATE INDEX IF NOT EXISTS idx_raw_orders_order ON raw.orders(order_id);
+CREATE INDEX IF NOT EXISTS idx_raw_order_items_order ON raw.order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_raw_payments_order ON raw.payments(order_id);
+CREATE INDEX IF NOT EXISTS idx_raw_shipments_order ON raw.shipments(order_id);
+CREATE INDEX IF NOT EXISTS idx_stg_orders_order ON staging.cleaned_orders(order_id);
+CREATE INDEX IF NOT EXISTS idx_stg_order_items_order ON staging.cleaned_order_items(order_id);
+CREATE INDEX IF NOT EXISTS idx_stg_payments_order ON staging.cleaned_payments(order_id);
+CREATE INDEX IF NOT EXISTS idx_stg_shipments_order ON staging.cleaned_shipments(order_id);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_order ON warehouse.fact_sales(order_id);
+CREATE INDEX IF NOT EXISTS idx_fact_payments_order ON warehouse.fact_payments(order_id);
+CREATE INDEX IF NOT EXISTS idx_fact_shipments_order ON warehouse.fact_shipments(order_id);
+"""
+
+# ---------- LAYER SQL ----------
+# Same cleaning/joins as pg_query/raw_query.sql, staging_query.sql and
+# warehouse_query.sql, restricted to the delta.
+
+DIM_STAGING_SQL = {
+    "vendors": """
+        INSERT INTO staging.cleaned_vendors
+        SELECT vendor_id, TRIM(company_name), LOWER(region), rating
+        FROM raw.vendors
+        WHERE vendor_id > %(last_id)s""",
+    "customers": """
+        INSERT INTO staging.cleaned_customers
+        SELECT customer_id, TRIM(name), LOWER(email), phone, region, TO_DATE(signup_date, 'YYYY-MM-DD')
+        FROM raw.customers
+        WHERE customer_id > %(last_id)s""",
+    "warehouses": """
+        INSERT INTO staging.cleaned_warehouses
+        SELECT warehouse_id, TRIM(warehouse_name), LOWER(region), capacity
+        FROM raw.warehouses
+        WHERE warehouse_id > %(last_id)s AND capacity >= 0""",
+    "products": """
+        INSERT INTO staging.cleaned_products
+        SELECT product_id, TRIM(product_name), LOWER(category), vendor_id, base_price, cost_price,
+               (base_price - cost_price)
+        FROM raw.products
+        WHERE product_id > %(last_id)s AND base_price >= 0 AND cost_price >= 0""",
+}
+
+DIM_WAREHOUSE_SQL = {
+    "vendors": """
+        INSERT INTO warehouse.dim_vendor
+        SELECT vendor_id, company_name, region, rating
+        FROM staging.cleaned_vendors WHERE vendor_id > %(last_id)s""",
+    "customers": """
+        INSERT INTO warehouse.dim_customer
+        SELECT customer_id, name, email, region, signup_date
+        FROM staging.cleaned_customers WHERE customer_id > %(last_id)s""",
+    "warehouses": """
+        INSERT INTO warehouse.dim_warehouse
+        SELECT warehouse_id, warehouse_name, region, capacity
+        FROM staging.cleaned_warehouses WHERE warehouse_id > %(last_id)s""",
+    "products": """
+        INSERT INTO warehouse.dim_product
+        SELECT product_id, product_name, category, vendor_id, base_price, cost_price, margin
+        FROM staging.cleaned_products WHERE product_id > %(last_id)s""",
+}
+
+DELTA = "SELECT order_id FROM etl_delta_orders"
+
+ORDER_STAGING_SQL = {
+    "orders": f"""
+        INSERT INTO staging.cleaned_orders
+        SELECT order_id, customer_id, TO_DATE(order_date, 'YYYY-MM-DD'),
+               LOWER(region), LOWER(payment_method), LOWER(status)
+        FROM raw.orders
+        WHERE order_id IN ({DELTA}) AND customer_id IS NOT NULL""",
+    "order_items": f"""
+        INSERT INTO staging.cleaned_order_items
+        SELECT order_item_id, order_id, product_id, quantity, unit_price, total_price
+        FROM raw.order_items
+        WHERE order_id IN ({DELTA}) AND order_item_id IS NOT NULL AND product_id IS NOT NULL""",
+    "payments": f"""
+        INSERT INTO staging.cleaned_payments
+        SELECT order_id, total_price, LOWER(payment_method), LOWER(payment_status),
+               TO_DATE(payment_date, 'YYYY-MM-DD')
+        FROM raw.payments
+        WHERE order_id IN ({DELTA})""",
+    "shipments": f"""
+        INSERT INTO staging.cleaned_shipments
+        SELECT order_id, warehouse_id, TO_DATE(ship_date, 'YYYY-MM-DD'),
+               TO_DATE(delivery_date, 'YYYY-MM-DD'), LOWER(status)
+        FROM raw.shipments
+        WHERE order_id IN ({DELTA}) AND warehouse_id IS NOT NULL""",
+}
+
+STAGING_TABLES = {t: f"staging.cleaned_{t}" for t in ORDER_TABLES}
+
+FACT_SQL = {
+    "warehouse.fact_sales": f"""
+        INSERT INTO warehouse.fact_sales
+        SELECT oi.order_id, oi.product_id, o.customer_id,
+               TO_CHAR(o.order_date, 'YYYYMMDD')::INT,
+               oi.quantity, oi.total_price,
+               (oi.quantity * p.cost_price),
+               (oi.total_price - (oi.quantity * p.cost_price)),
+               o.payment_method, o.status
+        FROM staging.cleaned_order_items oi
+        JOIN staging.cleaned_orders o ON oi.order_id = o.order_id
+        JOIN staging.cleaned_products p ON oi.product_id = p.product_id
+        WHERE oi.order_id IN ({DELTA})""",
+    "warehouse.fact_payments": f"""
+        INSERT INTO warehouse.fact_payments
+        SELECT p.order_id, o.customer_id, TO_CHAR(p.payment_date, 'YYYYMMDD')::INT,
+               p.total_price, p.payment_status, p.payment_method
+        FROM staging.cleaned_payments p
+        JOIN staging.cleaned_orders o ON p.order_id = o.order_id
+        WHERE p.order_id IN ({DELTA})""",
+    "warehouse.fact_shipments": f"""
+        INSERT INTO warehouse.fact_shipments
+        SELECT s.order_id, s.warehouse_id,
+               TO_CHAR(s.ship_date, 'YYYYMMDD')::INT,
+               TO_CHAR(s.delivery_date, 'YYYYMMDD')::INT,
+               (s.delivery_date - s.ship_date), s.status
+        FROM staging.cleaned_shipments s
+        WHERE s.order_id IN ({DELTA})""",
+}
+
+LOG_FACT_CHANGES = [
+    f"""
+    INSERT INTO etl.fact_sales_changes
+        (batch_id, sign, order_id, date_id, customer_id, product_id, quantity, revenue, profit)
+    SELECT %(batch_id)s, %(sign)s, order_id, date_id, customer_id, product_id, quantity, revenue, profit
+    FROM warehouse.fact_sales
+    WHERE order_id IN ({DELTA})""",
+    f"""
+    INSERT INTO etl.fact_shipments_changes (batch_id, sign, order_id, warehouse_id, days_to_deliver)
+    SELECT %(batch_id)s, %(sign)s, order_id, warehouse_id, days_to_deliver
+    FROM warehouse.fact_shipments
+    WHERE order_id IN ({DELTA}) AND ship_date_id IS NOT NULL AND delivery_date_id IS NOT NULL""",
+]
+
+
+# ---------- WATERMARKS ----------
+
+def get_watermarks(cur) -> dict:
+    """source_table -> (last_id, last_date); bootstrapped from raw on the first run."""
+    cur.execute("SELECT source_table, last_id, last_date FROM etl.watermarks")
+    marks = {t: (i, d) for t, i, d in cur.fetchall()}
+
+    for table, id_col in {**DIMENSIONS, "orders": "order_id"}.items():
+        if table in marks:
+            continue
+        if table == "orders":
+            cur.execute("SELECT MAX(order_id), MAX(TO_DATE(order_date, 'YYYY-MM-DD')) FROM raw.orders")
+            marks[table] = cur.fetchone()
+        else:
+            cur.execute(f"SELECT MAX({id_col}) FROM raw.{table}")
+            marks[table] = (cur.fetchone()[0], None)
+        if marks[table][0] is None:
+            raise RuntimeError(f"raw.{table} is empty — run the full build (warehouse.py + pg_query) first.")
+    return marks
+
+
+def set_watermark(cur, table: str, last_id, last_date=None):
+    cur.execute(
+        """
+        INSERT INTO etl.watermarks (source_table, last_id, last_date, updated_at)
+        VALUES (%(t)s, %(i)s, %(d)s, now())
+        ON CONFLICT (source_table) DO UPDATE
+        SET last_id = EXCLUDED.last_id, last_date = EXCLUDED.last_date, updated_at = now()
+        """,
+        {"t": table, "i": int(last_id), "d": last_date}
+    )
+
+
+# ---------- SOURCE DELTAS ----------
+
+def read_source(table: str, keep) -> pd.DataFrame:
+    """Rows of dataset/<table>.csv for which keep(chunk) is True, read in chunks."""
+    path = os.path.join(SOURCE_DIR, f"{table}.csv")
+    parts = [chunk[keep(chunk)] for chunk in pd.read_csv(path, chunksize=READ_CHUNK_ROWS)]
+    return pd.concat(parts, ignore_index=True)
+
+
+def changed_order_ids(cur, table: str, candidates: pd.DataFrame) -> set:
+    """Order ids whose rows in `candidates` differ from what raw.<table> holds."""
+    if candidates.empty:
+        return set()
+    ids = [int(i) for i in candidates["order_id"].unique()]
+    cols = ", ".join(f'"{c}"' for c in candidates.columns)
+    cur.execute(f"SELECT {cols} FROM raw.{table} WHERE order_id = ANY(%s)", (ids,))
+    existing = pd.DataFrame(cur.fetchall(), columns=list(candidates.columns))
+    existing = existing.astype(candidates.dtypes.to_dict(), errors="ignore")
+
+    # rows present on one side only = changed, added or removed
+    both = pd.concat([candidates, existing], ignore_index=True)
+    diff = both[~both.duplicated(keep=False)]
+    return set(diff["order_id"].astype(int))
+
+
+# ---------- REFRESH ----------
+
+def refresh_dimensions(cur, marks: dict) -> dict:
+    counts = {}
+    for table, id_col in DIMENSIONS.items():
+        last_id = marks[table][0]
+        new_rows = read_source(table, lambda c, col=id_col, last=last_id: c[col] > last)
+        counts[table] = len(new_rows)
+        if new_rows.empty:
+            continue
+        copy_dataframe(cur, new_rows, f"raw.{table}")
+        cur.execute(DIM_STAGING_SQL[table], {"last_id": int(last_id)})
+        cur.execute(DIM_WAREHOUSE_SQL[table], {"last_id": int(last_id)})
+        set_watermark(cur, table, new_rows[id_col].max())
+    return counts
+
+
+def refresh_orders(cur, marks: dict, batch_id: int) -> tuple:
+    last_id, last_date = marks["orders"]
+    recheck_from = (pd.Timestamp(last_date) - pd.Timedelta(days=RECHECK_DAYS)).strftime("%Y-%m-%d")
+
+    orders = read_source("orders", lambda c: (c["order_id"] > last_id) | (c["order_date"] >= recheck_from))
+    new_ids = set(orders.loc[orders["order_id"] > last_id, "order_id"].astype(int))
+    window_ids = set(orders["order_id"].astype(int)) - new_ids
+
+    deltas = {"orders": orders}
+    for table in ORDER_TABLES[1:]:
+        wanted = new_ids | window_ids
+        deltas[table] = read_source(table, lambda c, w=wanted: c["order_id"].isin(w))
+
+    changed_ids = set()
+    for table, df in deltas.items():
+        changed_ids |= changed_order_ids(cur, table, df[df["order_id"].isin(window_ids)])
+    changed_ids &= window_ids
+
+    delta_ids = new_ids | changed_ids
+    if not delta_ids:
+        return 0, 0
+
+    cur.execute("CREATE TEMP TABLE etl_delta_orders (order_id BIGINT PRIMARY KEY) ON COMMIT DROP")
+    copy_dataframe(cur, pd.DataFrame({"order_id": sorted(delta_ids)}), "etl_delta_orders")
+    cur.execute("ANALYZE etl_delta_orders")
+
+    # old fact rows go out with sign -1 ...
+    for sql in LOG_FACT_CHANGES:
+        cur.execute(sql, {"batch_id": batch_id, "sign": -1})
+
+    for table in ORDER_TABLES:
+        cur.execute(f"DELETE FROM raw.{table} WHERE order_id IN ({DELTA})")
+        copy_dataframe(cur, deltas[table][deltas[table]["order_id"].isin(delta_ids)], f"raw.{table}")
+        cur.execute(f"DELETE FROM {STAGING_TABLES[table]} WHERE order_id IN ({DELTA})")
+        cur.execute(ORDER_STAGING_SQL[table])
+
+    # new months get their fact_sales partition before the insert
+    if is_partitioned(cur):
+        delta_dates = pd.to_datetime(orders.loc[orders["order_id"].isin(delta_ids), "order_date"])
+        ensure_partitions(cur, delta_dates.min(), delta_dates.max())
+
+    for fact, sql in FACT_SQL.items():
+        cur.execute(f"DELETE FROM {fact} WHERE order_id IN ({DELTA})")
+        cur.execute(sql)
+
+    # ... and their replacements come in with +1
+    for sql in LOG_FACT_CHANGES:
+        cur.execute(sql, {"batch_id": batch_id, "sign": 1})
+
+    new_last_id = max(int(last_id), int(orders["order_id"].max()))
+    new_last_date = max(pd.Timestamp(last_date), pd.to_datetime(orders["order_date"]).max()).date()
+    set_watermark(cur, "orders", new_last_id, new_last_date)
+    return len(new_ids), len(changed_ids)
+
+
+def run_refresh(engine=None) -> dict:
+    engine = engine or get_engine()
+    start = time.perf_counter()
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(SETUP_SQL)
+        marks = get_watermarks(cur)
+        cur.execute("INSERT INTO etl.refresh_batches DEFAULT VALUES RETURNING batch_id")
+        batch_id = cur.fetchone()[0]
+
+        dims = refresh_dimensions(cur, marks)   # before orders: facts join new products
+        new_orders, changed_orders = refresh_orders(cur, marks, batch_id)
+
+        cur.execute(
+            "UPDATE etl.refresh_batches SET finished_at = now(), new_orders = %s, changed_orders = %s "
+            "WHERE batch_id = %s",
+            (new_orders, changed_orders, batch_id)
+        )
+        if new_orders or changed_orders:
+            # daily_revenue and the other KPI tables: kpi_maintenance.py
+            cur.execute("REFRESH MATERIALIZED VIEW analytics.daily_payments")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    summary = {"batch_id": batch_id, "new_orders": new_orders, "changed_orders": changed_orders,
+               "new_dimension_rows": dims, "seconds": round(time.perf_counter() - start, 2)}
+    print(f"✅ Incremental refresh #{batch_id}: {new_orders:,} new orders, {changed_orders:,} changed, "
+          f"dimension rows added {dims} in {summary['seconds']}s")
+    return summary
+
+
+if __name__ == "__main__":
+    run_refresh()
@@ -0,0 +1,432 @@
+# Incremental maintenance of the analytics KPI tables
+#
+# pg_query/analytics.sql rebuilds every KPI table from a full scan of the
+# fact tables. This engine keeps the same tables (same columns) up to date
+# from the signed fact deltas incremental_refresh.py logs per batch
+# (etl.fact_sales_changes / etl.fact_shipments_changes: replaced rows -1,
+# new rows +1):
+#   - mergeable state per key: kpi_daily_state (per date_id), kpi_customer_state,
+#     kpi_product_state, kpi_warehouse_state. Sums merge by addition; distinct
+#     order counts merge too because every order has exactly one date and one
+#     customer, so a delta order contributes exactly +1/-1 to its day and customer
+#   - only the dates/customers/products touched by the new batches are
+#     re-published into daily_revenue, customer_clv and inventory_kpis;
+#     core_kpis, repeat_purchase_rate and delivery_kpis are re-derived from the
+#     (small) state tables, never from the facts
+#   - the last merged batch id is a watermark in etl.watermarks, updated in the
+#     same transaction as the state
+#
+# First run (or --rebuild): state and KPI tables are built from one full scan.
+# --verify recomputes every KPI from the facts and diffs it against the
+# maintained tables.
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from db import get_engine
+from incremental_refresh import SETUP_SQL as ETL_SETUP_SQL
+
+WATERMARK = "kpi_maintenance"
+
+STATE_SQL = """
+CREATE SCHEMA IF NOT EXISTS analytics;
+
+CREATE TABLE IF NOT EXISTS analytics.kpi_daily_state (
+    date_id INT PRIMARY KEY,
+    revenue DOUBLE PRECISION,
+    profit DOUBLE PRECISION,
+    units BIGINT,
+    orders BIGINT
+);
+CREATE TABLE IF NOT EXISTS analytics.kpi_customer_state (
+    customer_id BIGINT PRIMARY KEY,
+    revenue DOUBLE PRECISION,
+    orders BIGINT
+);
+CREATE TABLE IF NOT EXISTS analytics.kpi_product_state (
+    product_id BIGINT PRIMARY KEY,
+    units BIGINT
+);
+CREATE TABLE IF NOT EXISTS analytics.kpi_warehouse_state (
+    warehouse_id BIGINT PRIMARY KEY,
+    days_sum BIGINT,
+    shipments BIGINT
+);
+"""
+
+# ---------- FULL BUILD ----------
+
+BOOTSTRAP_STATE_SQL = """
+TRUNCATE analytics.kpi_daily_state, analytics.kpi_customer_state,
+         analytics.kpi_product_state, analytics.kpi_warehouse_state;
+
+INSERT INTO analytics.kpi_daily_state
+SELECT date_id, SUM(revenue), SUM(profit), SUM(quantity), COUNT(DISTINCT order_id)
+FROM warehouse.fact_sales
+GROUP BY date_id;
+
+INSERT INTO analytics.kpi_customer_state
+SELECT customer_id, SUM(revenue), COUNT(DISTINCT order_id)
+FROM warehouse.fact_sales
+GROUP BY customer_id;
+
+INSERT INTO analytics.kpi_product_state
+SELECT product_id, SUM(quantity)
+FROM warehouse.fact_sales
+GROUP BY product_id;
+
+INSERT INTO analytics.kpi_warehouse_state
+SELECT warehouse_id, SUM(days_to_deliver), COUNT(*)
+FROM warehouse.fact_shipments
+WHERE ship_date_id IS NOT NULL AND delivery_date_id IS NOT NULL
+GROUP BY warehouse_id;
+"""
+
+# KPI tables keep the column names/types analytics.sql gives them
+KPI_TABLES_SQL = """
+CREATE TABLE analytics.daily_revenue (
+    full_date DATE PRIMARY KEY,
+    total_revenue DOUBLE PRECISION,
+    total_profit DOUBLE PRECISION,
+    total_orders BIGINT
+);
+CREATE TABLE analytics.customer_clv (
+    customer_id BIGINT PRIMARY KEY,
+    name TEXT,
+    lifetime_value DOUBLE PRECISION,
+    total_orders BIGINT
+);
+CREATE TABLE analytics.inventory_kpis (
+    product_id BIGINT PRIMARY KEY,
+    product_name TEXT,
+    total_stock NUMERIC,
+    total_sold NUMERIC,
+    stockout_flag INT,
+    inventory_turnover DOUBLE PRECISION
+);
+"""
+
+KPI_TABLES = ["daily_revenue", "core_kpis", "customer_clv", "repeat_purchase_rate",
+              "inventory_kpis", "delivery_kpis"]
+
+# ---------- PUBLISH (state -> KPI tables) ----------
+# {keys} is either "TRUE" (everything) or a filter on the touched keys, with
+# the column qualified wherever the statement joins tables sharing its name.
+
+PUBLISH_DAILY_SQL = """
+DELETE FROM analytics.daily_revenue r
+USING warehouse.dim_date d
+WHERE r.full_date = d.full_date AND {keys};
+
+INSERT INTO analytics.daily_revenue
+SELECT d.full_date, s.revenue, s.profit, s.orders
+FROM analytics.kpi_daily_state s
+JOIN warehouse.dim_date d ON s.date_id = d.date_id
+WHERE s.orders > 0 AND {keys};
+"""
+
+PUBLISH_CUSTOMER_SQL = """
+DELETE FROM analytics.customer_clv c WHERE {delete_keys};
+
+INSERT INTO analytics.customer_clv
+SELECT c.customer_id, c.name, s.revenue, s.orders
+FROM analytics.kpi_customer_state s
+JOIN warehouse.dim_customer c ON s.customer_id = c.customer_id
+WHERE s.orders > 0 AND {keys};
+"""
+
+PUBLISH_PRODUCT_SQL = """
+DELETE FROM analytics.inventory_kpis st WHERE {keys};
+
+INSERT INTO analytics.inventory_kpis
+SELECT
+    st.product_id,
+    dp.product_name,
+    st.total_stock,
+    COALESCE(ps.units, 0),
+    CASE WHEN st.total_stock = 0 THEN 1 ELSE 0 END,
+    COALESCE(ps.units::float / NULLIF(st.total_stock, 0), 0)
+FROM (
+    SELECT product_id, SUM(stock_qty) AS total_stock
+    FROM warehouse.fact_inventory st
+    WHERE {keys}
+    GROUP BY product_id
+) st
+JOIN warehouse.dim_product dp ON st.product_id = dp.product_id
+LEFT JOIN analytics.kpi_product_state ps ON st.product_id = ps.product_id;
+"""
+
+PUBLISH_SUMMARY_SQL = """
+DROP TABLE IF EXISTS analytics.core_kpis;
+CREATE TABLE analytics.core_kpis AS
+SELECT
+    SUM(d.revenue) AS revenue,
+    SUM(d.profit) AS gross_margin,
+    SUM(d.orders) AS total_orders,
+    SUM(d.units) AS total_units_sold,
+    (SELECT COUNT(*) FROM analytics.kpi_customer_state WHERE orders > 0) AS total_customers
+FROM analytics.kpi_daily_state d;
+
+DROP TABLE IF EXISTS analytics.repeat_purchase_rate;
+CREATE TABLE analytics.repeat_purchase_rate AS
+SELECT COUNT(*) FILTER (WHERE orders > 1)::float / COUNT(*) * 100 AS repeat_purchase_rate_pct
+FROM analytics.kpi_customer_state
+WHERE orders > 0;
+
+DROP TABLE IF EXISTS analytics.delivery_kpis;
+CREATE TABLE analytics.delivery_kpis AS
+SELECT
+    dw.warehouse_name,
+    SUM(s.days_sum)::numeric / NULLIF(SUM(s.shipments), 0) AS avg_delivery_days,
+    SUM(s.shipments) AS total_shipments
+FROM analytics.kpi_warehouse_state s
+JOIN warehouse.dim_warehouse dw ON s.warehouse_id = dw.warehouse_id
+GROUP BY dw.warehouse_name
+HAVING SUM(s.shipments) > 0;
+"""
+
+# ---------- MERGE (deltas -> state) ----------
+
+DELTA_ORDERS_SQL = """
+CREATE TEMP TABLE kpi_delta_orders ON COMMIT DROP AS
+SELECT order_id, sign, date_id, customer_id,
+       SUM(revenue) AS revenue, SUM(profit) AS profit, SUM(quantity) AS units
+FROM etl.fact_sales_changes
+WHERE batch_id > %(from_batch)s AND batch_id <= %(to_batch)s
+GROUP BY order_id, sign, date_id, customer_id;
+"""
+
+MERGE_STATE_SQL = """
+INSERT INTO analytics.kpi_daily_state AS s (date_id, revenue, profit, units, orders)
+SELECT date_id, SUM(sign * revenue), SUM(sign * profit), SUM(sign * units), SUM(sign)
+FROM kpi_delta_orders
+GROUP BY date_id
+ON CONFLICT (date_id) DO UPDATE SET
+    revenue = s.revenue + EXCLUDED.revenue,
+    profit = s.profit + EXCLUDED.profit,
+    units = s.units + EXCLUDED.units,
+    orders = s.orders + EXCLUDED.orders;
+
+INSERT INTO analytics.kpi_customer_state AS s (customer_id, revenue, orders)
+SELECT customer_id, SUM(sign * revenue), SUM(sign)
+FROM kpi_delta_orders
+GROUP BY customer_id
+ON CONFLICT (customer_id) DO UPDATE SET
+    revenue = s.revenue + EXCLUDED.revenue,
+    orders = s.orders + EXCLUDED.orders;
+
+INSERT INTO analytics.kpi_product_state AS s (product_id, units)
+SELECT product_id, SUM(sign * quantity)
+FROM etl.fact_sales_changes
+WHERE batch_id > %(from_batch)s AND batch_id <= %(to_batch)s
+GROUP BY product_id
+ON CONFLICT (product_id) DO UPDATE SET units = s.units + EXCLUDED.units;
+
+INSERT INTO analytics.kpi_warehouse_state AS s (warehouse_id, days_sum, shipments)
+SELECT warehouse_id, SUM(sign * days_to_deliver), SUM(sign)
+FROM etl.fact_shipments_changes
+WHERE batch_id > %(from_batch)s AND batch_id <= %(to_batch)s
+GROUP BY warehouse_id
+ON CONFLICT (warehouse_id) DO UPDATE SET
+    days_sum = s.days_sum + EXCLUDED.days_sum,
+    shipments = s.shipments + EXCLUDED.shipments;
+"""
+
+TOUCHED_KEYS_SQL = {
+    "dates": "SELECT DISTINCT date_id FROM kpi_delta_orders",
+    "customers": "SELECT DISTINCT customer_id FROM kpi_delta_orders",
+    "products": """SELECT DISTINCT product_id FROM etl.fact_sales_changes
+                   WHERE batch_id > %(from_batch)s AND batch_id <= %(to_batch)s""",
+}
+
+# ---------- VERIFY (full recompute, as in analytics.sql) ----------
+
+FULL_RECOMPUTE = {
+    # table: (key columns, value columns, query)
+    "daily_revenue": (["full_date"], ["total_revenue", "total_profit", "total_orders"], """
+        SELECT d.full_date, SUM(f.revenue) AS total_revenue, SUM(f.profit) AS total_profit,
+               COUNT(DISTINCT f.order_id) AS total_orders
+        FROM warehouse.fact_sales f
+        JOIN warehouse.dim_date d ON f.date_id = d.date_id
+        GROUP BY d.full_date"""),
+    "core_kpis": ([], ["revenue", "gross_margin", "total_orders", "total_units_sold", "total_customers"], """
+        SELECT SUM(f.revenue) AS revenue, SUM(f.profit) AS gross_margin,
+               COUNT(DISTINCT f.order_id) AS total_orders, SUM(f.quantity) AS total_units_sold,
+               COUNT(DISTINCT f.customer_id) AS total_customers
+        FROM warehouse.fact_sales f"""),
+    "customer_clv": (["customer_id"], ["name", "lifetime_value", "total_orders"], """
+        SELECT c.customer_id, c.name, SUM(f.revenue) AS lifetime_value,
+               COUNT(DISTINCT f.order_id) AS total_orders
+        FROM warehouse.fact_sales f
+        JOIN warehouse.dim_customer c ON f.customer_id = c.customer_id
+        GROUP BY c.customer_id, c.name"""),
+    "repeat_purchase_rate": ([], ["repeat_purchase_rate_pct"], """
+        SELECT COUNT(*) FILTER (WHERE order_count > 1)::float / COUNT(*) * 100 AS repeat_purchase_rate_pct
+        FROM (
+            SELECT customer_id, COUNT(DISTINCT order_id) AS order_count
+            FROM warehouse.fact_sales
+            GROUP BY customer_id
+        ) x"""),
+    # sales and stock aggregated per product before the join (no fan-out)
+    "inventory_kpis": (["product_id"], ["product_name", "total_stock", "total_sold", "stockout_flag",
+                                        "inventory_turnover"], """
+        SELECT st.product_id, dp.product_name, st.total_stock,
+               COALESCE(sa.total_sold, 0) AS total_sold,
+               CASE WHEN st.total_stock = 0 THEN 1 ELSE 0 END AS stockout_flag,
+               COALESCE(sa.total_sold::float / NULLIF(st.total_stock, 0), 0) AS inventory_turnover
+        FROM (SELECT product_id, SUM(stock_qty) AS total_stock
+              FROM warehouse.fact_inventory GROUP BY product_id) st
+        LEFT JOIN (SELECT product_id, SUM(quantity) AS total_sold
+                   FROM warehouse.fact_sales GROUP BY product_id) sa ON st.product_id = sa.product_id
+        JOIN warehouse.dim_product dp ON st.product_id = dp.product_id"""),
+    "delivery_kpis": (["warehouse_name"], ["avg_delivery_days", "total_shipments"], """
+        SELECT dw.warehouse_name,
+               AVG(dd_delivery.full_date::date - dd_ship.full_date::date) AS avg_delivery_days,
+               COUNT(fs.order_id) AS total_shipments
+        FROM warehouse.fact_shipments fs
+        JOIN warehouse.dim_warehouse dw ON fs.warehouse_id = dw.warehouse_id
+        JOIN warehouse.dim_date dd_ship ON fs.ship_date_id = dd_ship.date_id
+        JOIN warehouse.dim_date dd_delivery ON fs.delivery_date_id = dd_delivery.date_id
+        GROUP BY dw.warehouse_name"""),
+}
+
+
+# ---------- ENGINE ----------
+
+def _key_filter(column: str, values) -> str:
+    return "TRUE" if values is None else f"{column} = ANY(%(keys)s)"
+
+
+def _execute(cur, sql: str, params: dict = None):
+    cur.execute(sql, params or {})
+
+
+def _drop_kpi_tables(cur):
+    """Drop KPI tables/materialized views left by analytics.sql or warehouse_query.sql."""
+    for table in KPI_TABLES:
+        cur.execute("SELECT 1 FROM pg_matviews WHERE schemaname = 'analytics' AND matviewname = %s", (table,))
+        kind = "MATERIALIZED VIEW" if cur.fetchone() else "TABLE"
+        cur.execute(f"DROP {kind} IF EXISTS analytics.{table}")
+
+
+def publish(cur, dates=None, customers=None, products=None):
+    """Rewrite KPI rows for the given keys (None = all) from the state tables."""
+    _execute(cur, PUBLISH_DAILY_SQL.format(keys=_key_filter("d.date_id", dates)), {"keys": dates})
+    _execute(cur, PUBLISH_CUSTOMER_SQL.format(delete_keys=_key_filter("c.customer_id", customers),
+                                              keys=_key_filter("s.customer_id", customers)), {"keys": customers})
+    _execute(cur, PUBLISH_PRODUCT_SQL.format(keys=_key_filter("st.product_id", products)), {"keys": products})
+    _execute(cur, PUBLISH_SUMMARY_SQL)
+
+
+def _last_finished_batch(cur) -> int:
+    cur.execute("SELECT COALESCE(MAX(batch_id), 0) FROM etl.refresh_batches WHERE finished_at IS NOT NULL")
+    return cur.fetchone()[0]
+
+
+def _set_watermark(cur, batch_id: int):
+    cur.execute(
+        """
+        INSERT INTO etl.watermarks (source_table, last_id, updated_at)
+        VALUES (%s, %s, now())
+        ON CONFLICT (source_table) DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = now()
+        """,
+        (WATERMARK, batch_id)
+    )
+
+
+def rebuild(cur) -> int:
+    """State + KPI tables from one full scan; returns the batch id they cover."""
+    to_batch = _last_finished_batch(cur)
+    cur.execute(STATE_SQL)
+    cur.execute(BOOTSTRAP_STATE_SQL)
+    _drop_kpi_tables(cur)
+    cur.execute(KPI_TABLES_SQL)
+    publish(cur)
+    _set_watermark(cur, to_batch)
+    return to_batch
+
+
+def run_maintenance(engine=None, force_rebuild: bool = False) -> dict:
+    engine = engine or get_engine()
+    start = time.perf_counter()
+
+    raw = engine.raw_connection()
+    try:
+        # one snapshot for "facts as of batch N" (full scans) and the batch log;
+        # set per transaction, not per session: the pooled connection is shared
+        cur = raw.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute(ETL_SETUP_SQL)
+        cur.execute("SELECT last_id FROM etl.watermarks WHERE source_table = %s", (WATERMARK,))
+        row = cur.fetchone()
+
+        if force_rebuild or row is None:
+            to_batch = rebuild(cur)
+            summary = {"mode": "rebuild", "batch_id": to_batch}
+        else:
+            from_batch, to_batch = row[0], _last_finished_batch(cur)
+            params = {"from_batch": from_batch, "to_batch": to_batch}
+            touched = {"dates": [], "customers": [], "products": []}
+            if to_batch > from_batch:
+                cur.execute(DELTA_ORDERS_SQL, params)
+                cur.execute(MERGE_STATE_SQL, params)
+                for name, sql in TOUCHED_KEYS_SQL.items():
+                    cur.execute(sql, params)
+                    touched[name] = [r[0] for r in cur.fetchall()]
+                publish(cur, **touched)
+                _set_watermark(cur, to_batch)
+            summary = {"mode": "incremental", "batches": to_batch - from_batch,
+                       **{k: len(v) for k, v in touched.items()}}
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"✅ KPI maintenance: {summary}")
+    return summary
+
+
+def _compare(expected: pd.DataFrame, actual: pd.DataFrame, keys: list, values: list,
+             rtol: float = 1e-9, atol: float = 1e-6) -> dict:
+    if not keys:
+        expected, actual, keys = expected.assign(_row=0), actual.assign(_row=0), ["_row"]
+    merged = expected.merge(actual, on=keys, how="outer", suffixes=("_full", "_inc"), indicator=True)
+    report = {"rows_full": len(expected), "rows_maintained": len(actual),
+              "missing_or_extra": int((merged["_merge"] != "both").sum())}
+    both = merged[merged["_merge"] == "both"]
+    for col in values:
+        a, b = both[f"{col}_full"], both[f"{col}_inc"]
+        a_num, b_num = pd.to_numeric(a, errors="coerce"), pd.to_numeric(b, errors="coerce")
+        if a_num.notna().any():
+            bad = ~np.isclose(a_num.astype(float), b_num.astype(float), rtol=rtol, atol=atol, equal_nan=True)
+        else:
+            bad = a.astype(str).ne(b.astype(str))
+        report[col] = int(bad.sum())
+    report["ok"] = all(v == 0 for k, v in report.items() if k not in ("rows_full", "rows_maintained"))
+    return report
+
+
+def verify(engine=None) -> dict:
+    """Diff every maintained KPI table against a full recompute from the facts."""
+    engine = engine or get_engine()
+    results = {}
+    with engine.connect() as conn:
+        for table, (keys, values, sql) in FULL_RECOMPUTE.items():
+            expected = pd.read_sql(sql, conn)
+            actual = pd.read_sql(f"SELECT * FROM analytics.{table}", conn)
+            results[table] = _compare(expected, actual, keys, values)
+            mark = "✔️" if results[table]["ok"] else "❌"
+            print(f"   {mark} {table}: {results[table]}")
+    return results
+
+
+if __name__ == "__main__":
+    # python kpi_maintenance.py [--rebuild] [--verify]
+    run_maintenance(force_rebuild="--rebuild" in sys.argv)
+    if "--verify" in sys.argv:
+        verify()
@@ -0,0 +1,129 @@
+# Parallel, dependency-aware table loader
+#
+# Loads independent tables concurrently on a thread pool (each load takes its
+# own pooled connection and commits its own transaction):
+#   - a table starts only after the tables it depends on loaded successfully;
+#     dependencies are the foreign keys the target database declares
+#     (declared_dependencies, read at plan time), so tables without
+#     constraints all load in parallel
+#   - ready tables start largest-file-first, so total time is bounded by the
+#     largest table rather than the sum of all of them
+#   - a failed table is retried on its own (with backoff); other tables are
+#     not rolled back, and only its dependents are skipped
+#   - a per-table timing summary is printed at the end
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from sqlalchemy import inspect
+
+
+def declared_dependencies(engine, tables, schema: str = None) -> dict:
+    """table -> [parent tables], from the foreign keys declared in the database.
+
+    Only parents that are part of this load count; tables that don't exist yet
+    (created by the load) have no constraints to respect.
+    """
+    insp = inspect(engine)
+    existing = set(insp.get_table_names(schema=schema))
+    deps = {}
+    for table in tables:
+        parents = set()
+        if table in existing:
+            for fk in insp.get_foreign_keys(table, schema=schema):
+                parent = fk["referred_table"]
+                if parent != table and parent in tables and fk.get("referred_schema") in (None, schema):
+                    parents.add(parent)
+        deps[table] = sorted(parents)
+    return deps
+
+
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def run_load_plan(tables: dict, load_fn, workers: int = 4, dependencies: dict = None,
+                  retries: int = 2, backoff: float = 2.0) -> dict:
+    """
+    tables: table_name -> csv path
+    load_fn(table_name, csv_path) -> LoadStats (anything with .rows)
+    dependencies: table_name -> [parent tables]; None = load everything in parallel
+
+    Returns table_name -> result dict (status, attempts, rows, seconds, error).
+    """
+    dependencies = dependencies or {}
+    deps = {t: [d for d in dependencies.get(t, []) if d in tables] for t in tables}
+    results = {t: {"status": "pending", "attempts": 0, "rows": None, "seconds": 0.0, "error": None} for t in tables}
+
+    def _attempt(table):
+        attempt = results[table]["attempts"]
+        if attempt > 0:
+            time.sleep(backoff * attempt)
+        start = time.perf_counter()
+        try:
+            return load_fn(table, tables[table]), time.perf_counter() - start
+        except Exception as e:
+            e.elapsed = time.perf_counter() - start
+            raise
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="loader") as pool:
+        running = {}
+
+        def _submit_ready():
+            ready = [
+                t for t, r in results.items()
+                if r["status"] == "pending" and all(results[d]["status"] == "done" for d in deps[t])
+            ]
+            for t in sorted(ready, key=lambda t: _file_size(tables[t]), reverse=True):
+                results[t]["status"] = "running"
+                running[pool.submit(_attempt, t)] = t
+
+        def _skip_dependents(failed):
+            for t, r in results.items():
+                if r["status"] == "pending" and failed in deps[t]:
+                    r["status"] = "skipped"
+                    r["error"] = f"dependency '{failed}' failed"
+                    _skip_dependents(t)
+
+        _submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                table = running.pop(fut)
+                r = results[table]
+                r["attempts"] += 1
+                try:
+                    stats, seconds = fut.result()
+                    r.update(status="done", rows=getattr(stats, "rows", None), seconds=seconds, error=None)
+                    print(f"   ✔️ {stats}")
+                except Exception as e:
+                    r["seconds"] += getattr(e, "elapsed", 0.0)
+                    r["error"] = str(e)
+                    if r["attempts"] <= retries:
+                        print(f"   🔁 {table} failed (attempt {r['attempts']}): {e} — retrying")
+                        running[pool.submit(_attempt, table)] = table
+                    else:
+                        print(f"   ❌ {table} failed after {r['attempts']} attempts: {e}")
+                        r["status"] = "failed"
+                        _skip_dependents(table)
+            _submit_ready()
+
+    print_summary(results, time.perf_counter() - wall_start)
+    return results
+
+
+def print_summary(results: dict, wall_seconds: float):
+    print(f"\n{'Table':<22} | {'Status':<8} | {'Tries':<5} | {'Rows':>12} | {'Seconds':>8} | {'Rows/sec':>12}")
+    print("-" * 82)
+    for table, r in sorted(results.items(), key=lambda kv: -kv[1]["seconds"]):
+        rows = f"{r['rows']:,}" if r["rows"] is not None else "-"
+        rate = f"{r['rows'] / r['seconds']:,.0f}" if r["rows"] and r["seconds"] > 0 else "-"
+        print(f"{table:<22} | {r['status']:<8} | {r['attempts']:<5} | {rows:>12} | {r['seconds']:>8.2f} | {rate:>12}")
+        if r["status"] in ("failed", "skipped"):
+            print(f"{'':<22}   ↳ {r['error']}")
+
+    serial = sum(r["seconds"] for r in results.values())
+    print("-" * 82)
+    print(f"Wall time: {wall_seconds:.2f}s (sum of table loads: {serial:.2f}s)")
@@ -0,0 +1,225 @@
+# Pre-aggregated sales cube for dashboards (analytics.sales_cube)
+#
+# One GROUPING SETS pass over warehouse.fact_sales materializes revenue,
+# profit, quantity and order_count for every combination of
+#   region, category, payment_method, order_status
+# at month grain (month_id = YYYYMM), and at day grain (date_id) for up to
+# DAILY_MAX_DIMS dimensions at a time: 27 rollups in one table, told apart by
+# grouping_id (bit set = that column is rolled up, bit order as in CUBE_COLS).
+# Day x 3-4 dimension rollups would be nearly as large as fact_sales itself;
+# the rare query needing one is answered from the facts instead.
+#
+# Every combination is stored rather than derived from the finest one because
+# order_count is COUNT(DISTINCT order_id): an order has one date, customer
+# region, payment method and status, so its count adds up across those and
+# across days, but an order with items in two categories would be counted
+# twice if category rows were summed. query() therefore reads exactly the
+# rollup grouped by (group-by + filter columns), at month grain when the date
+# range is whole months, and only ever sums across time.
+#
+# Refresh: the first run (or --rebuild) builds everything; later runs
+# recompute the months touched by new incremental_refresh.py batches
+# (etl.fact_sales_changes after the "olap_cube" watermark), reading only
+# those fact_sales partitions.
+#
+# python olap_cube.py [--rebuild]
+
+import sys
+import time
+from datetime import date
+from itertools import combinations
+
+import pandas as pd
+
+from db import get_engine
+from feature_store import pending_start
+from incremental_refresh import SETUP_SQL as ETL_SETUP_SQL, set_watermark
+
+WATERMARK = "olap_cube"
+CUBE_TABLE = "analytics.sales_cube"
+DIMENSIONS = ["region", "category", "payment_method", "order_status"]
+CUBE_COLS = ["date_id"] + DIMENSIONS  # GROUPING() argument order
+MEASURES = ["revenue", "profit", "quantity", "order_count"]
+DAILY_MAX_DIMS = 2  # day-grain rollups store at most this many dimensions
+
+TABLE_SQL = f"""
+CREATE SCHEMA IF NOT EXISTS analytics;
+CREATE TABLE IF NOT EXISTS {CUBE_TABLE} (
+    grouping_id SMALLINT,
+    month_id INT,
+    date_id INT,
+    region TEXT,
+    category TEXT,
+    payment_method TEXT,
+    order_status TEXT,
+    revenue DOUBLE PRECISION,
+    profit DOUBLE PRECISION,
+    quantity BIGINT,
+    order_count BIGINT
+);
+CREATE INDEX IF NOT EXISTS idx_sales_cube_lookup ON {CUBE_TABLE} (grouping_id, month_id, date_id);
+"""
+
+
+def _grouping_sets() -> str:
+    sets = []
+    for time_cols, max_dims in ((["month_id", "date_id"], DAILY_MAX_DIMS), (["month_id"], len(DIMENSIONS))):
+        for n in range(max_dims + 1):
+            for dims in combinations(DIMENSIONS, n):
+                sets.append("(" + ", ".join(time_cols + list(dims)) + ")")
+    return ",\n        ".join(sets)
+
+
+# fact rows with their cube columns (date_id / 100 is integer division: YYYYMM)
+SOURCE_SQL = """
+    SELECT
+        f.date_id / 100 AS month_id,
+        f.date_id,
+        c.region,
+        p.category,
+        f.payment_method,
+        f.order_status,
+        f.revenue, f.profit, f.quantity, f.order_id
+    FROM warehouse.fact_sales f
+    JOIN warehouse.dim_customer c ON f.customer_id = c.customer_id
+    JOIN warehouse.dim_product p  ON f.product_id = p.product_id
+"""
+
+BUILD_SQL = f"""
+INSERT INTO {CUBE_TABLE}
+SELECT
+    GROUPING({", ".join(CUBE_COLS)}) AS grouping_id,
+    month_id, date_id, {", ".join(DIMENSIONS)},
+    SUM(revenue), SUM(profit), SUM(quantity), COUNT(DISTINCT order_id)
+FROM ({SOURCE_SQL}
+    WHERE f.date_id >= %(start_id)s
+) s
+GROUP BY GROUPING SETS (
+        {_grouping_sets()}
+);
+"""
+
+
+def grouping_id(rolled_up: set) -> int:
+    """grouping_id of the rollup where the columns in `rolled_up` are aggregated away."""
+    return sum(1 << (len(CUBE_COLS) - 1 - i) for i, col in enumerate(CUBE_COLS) if col in rolled_up)
+
+
+# ---------- REFRESH ----------
+
+def refresh(engine=None, rebuild: bool = False) -> dict:
+    """Build the cube (first run / rebuild) or recompute the months with new sales."""
+    engine = engine or get_engine()
+    t0 = time.perf_counter()
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(ETL_SETUP_SQL)
+        cur.execute(TABLE_SQL)
+        cur.execute(f"SELECT EXISTS (SELECT 1 FROM {CUBE_TABLE})")
+        built = cur.fetchone()[0]
+        start, to_batch = pending_start(cur, WATERMARK)
+
+        if rebuild or not built:
+            cur.execute(f"TRUNCATE {CUBE_TABLE}")
+            start_month = 0
+        elif start is None:
+            print("✔️ Sales cube up to date.")
+            raw.rollback()
+            return {"start_month": None, "rows": 0}
+        else:
+            start_month = start.year * 100 + start.month
+            cur.execute(f"DELETE FROM {CUBE_TABLE} WHERE month_id >= %s", (start_month,))
+
+        cur.execute(BUILD_SQL, {"start_id": start_month * 100 + 1})
+        rows = cur.rowcount
+        if to_batch is not None:
+            set_watermark(cur, WATERMARK, to_batch)
+        raw.commit()
+        cur.execute(f"ANALYZE {CUBE_TABLE}")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    seconds = time.perf_counter() - t0
+    scope = "all months" if start_month == 0 else f"months >= {start_month}"
+    print(f"✅ Sales cube refreshed ({scope}): {rows:,} rows in {seconds:.2f}s")
+    return {"start_month": start_month or None, "rows": rows, "seconds": seconds}
+
+
+# ---------- QUERY ----------
+
+def _date_id(d: date) -> int:
+    return d.year * 10_000 + d.month * 100 + d.day
+
+
+def query(by=(), where: dict = None, start: date = None, end: date = None, grain: str = None,
+          measures=MEASURES, engine=None) -> pd.DataFrame:
+    """Slice-and-dice from the cube.
+
+    by:    dimensions to group by (subset of DIMENSIONS)
+    where: {dimension: value or list of values}
+    start / end: date range [start, end)
+    grain: "day" / "month" to also group by time, None for totals over the range
+    """
+    where = where or {}
+    needed = set(by) | set(where)
+    unknown = needed - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown cube dimensions: {sorted(unknown)}. Available: {DIMENSIONS}")
+
+    # month grain if nothing needs days: smaller rollup, same answer
+    whole_months = all(d is None or d.day == 1 for d in (start, end))
+    daily = grain == "day" or not whole_months
+    from_facts = daily and len(needed) > DAILY_MAX_DIMS  # no day rollup with that many dimensions
+    rolled_up = (set(DIMENSIONS) - needed) | (set() if daily else {"date_id"})
+
+    conditions, params = [], {}
+    if not from_facts:
+        conditions.append("grouping_id = %(gid)s")
+        params["gid"] = grouping_id(rolled_up)
+    if daily:
+        if start:
+            conditions.append("date_id >= %(start_id)s")
+            params["start_id"] = _date_id(start)
+        if end:
+            conditions.append("date_id < %(end_id)s")
+            params["end_id"] = _date_id(end)
+    else:
+        if start:
+            conditions.append("month_id >= %(start_month)s")
+            params["start_month"] = start.year * 100 + start.month
+        if end:
+            conditions.append("month_id < %(end_month)s")
+            params["end_month"] = end.year * 100 + end.month
+    for i, (dim, value) in enumerate(where.items()):
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        conditions.append(f"{dim} = ANY(%(w{i})s)")
+        params[f"w{i}"] = values
+
+    time_col = {"day": ["date_id"], "month": ["month_id"]}.get(grain, [])
+    group_cols = time_col + list(by)
+    if from_facts:
+        aggregates = [f"COUNT(DISTINCT order_id) AS {m}" if m == "order_count" else f"SUM({m}) AS {m}"
+                      for m in measures]
+        source = f"({SOURCE_SQL}) s"
+    else:
+        aggregates = [f"SUM({m}) AS {m}" for m in measures]  # only ever across time rows
+        source = CUBE_TABLE
+    sql = (
+        f"SELECT {', '.join(group_cols + aggregates)} "
+        f"FROM {source}" + (f" WHERE {' AND '.join(conditions)}" if conditions else "")
+        + (f" GROUP BY {', '.join(group_cols)} ORDER BY {', '.join(group_cols)}" if group_cols else "")
+    )
+
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        return pd.read_sql(sql, conn, params=params)
+
+
+if __name__ == "__main__":
+    refresh(rebuild="--rebuild" in sys.argv)
@@ -0,0 +1,188 @@
+# Partition maintenance for warehouse.fact_sales
+#
+# fact_sales is RANGE-partitioned by month on date_id (YYYYMMDD ints, see
+# pg_query/warehouse_query.sql): warehouse.fact_sales_YYYYMM holds
+# [YYYYMM01, next month's YYYYMM01), warehouse.fact_sales_default catches
+# anything outside the existing months.
+#   - ensure_partitions() creates missing months for a date range; rows that
+#     already landed in the default partition for that month are moved in
+#   - apply_retention() drops months older than the retention window
+#     (KPI state in kpi_maintenance.py keeps their totals; a --verify full
+#     recompute will then only cover the retained months)
+#   - migrate() turns an existing unpartitioned fact_sales into this layout
+# Indexes: BRIN on date_id (rows are inserted in date order), B-tree on
+# product/customer/order ids; all are defined on the parent and cascade to
+# every partition.
+#
+# python partition_manager.py [--migrate] [--retention-months N]
+
+import sys
+from datetime import date
+
+from db import get_engine
+
+PARENT = "warehouse.fact_sales"
+DEFAULT_PARTITION = "fact_sales_default"
+MONTHS_AHEAD = 3
+RETENTION_MONTHS = None  # None = keep all history
+
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_fact_sales_date_brin ON warehouse.fact_sales USING BRIN (date_id);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_product ON warehouse.fact_sales(product_id);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_customer ON warehouse.fact_sales(customer_id);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_order ON warehouse.fact_sales(order_id);
+"""
+
+
+# ---------- MONTH HELPERS ----------
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def date_id(d: date) -> int:
+    return d.year * 10_000 + d.month * 100 + d.day
+
+
+def partition_name(month: date) -> str:
+    return f"fact_sales_{month:%Y%m}"
+
+
+def month_range(start, end) -> list:
+    months, m = [], month_start(start)
+    while m <= month_start(end):
+        months.append(m)
+        m = add_months(m, 1)
+    return months
+
+
+# ---------- CATALOG ----------
+
+def is_partitioned(cur) -> bool:
+    cur.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.oid = to_regclass(%s)",
+        (PARENT,)
+    )
+    return cur.fetchone() is not None
+
+
+def existing_partitions(cur) -> dict:
+    """Monthly partitions of fact_sales: first day of month -> table name."""
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s)",
+        (PARENT,)
+    )
+    months = {}
+    for (name,) in cur.fetchall():
+        suffix = name.rsplit("_", 1)[-1]
+        if suffix.isdigit() and len(suffix) == 6:
+            months[date(int(suffix[:4]), int(suffix[4:]), 1)] = name
+    return months
+
+
+# ---------- CREATION / RETENTION ----------
+
+def create_partition(cur, month: date):
+    lo, hi = date_id(month), date_id(add_months(month, 1))
+    name = partition_name(month)
+
+    # rows already in the default partition would block the new range
+    cur.execute(f"CREATE TEMP TABLE _moved_rows (LIKE {PARENT})")
+    cur.execute(
+        f"WITH moved AS (DELETE FROM warehouse.{DEFAULT_PARTITION} WHERE date_id >= %s AND date_id < %s RETURNING *) "
+        f"INSERT INTO _moved_rows SELECT * FROM moved",
+        (lo, hi)
+    )
+    moved = cur.rowcount
+    cur.execute(f"CREATE TABLE warehouse.{name} PARTITION OF {PARENT} FOR VALUES FROM ({lo}) TO ({hi})")
+    if moved:
+        cur.execute(f"INSERT INTO {PARENT} SELECT * FROM _moved_rows ORDER BY date_id")
+    cur.execute("DROP TABLE _moved_rows")
+    return moved
+
+
+def ensure_partitions(cur, start, end) -> list:
+    """Create the monthly partitions covering [start, end]; returns the months created."""
+    existing = existing_partitions(cur)
+    created = []
+    for month in month_range(start, end):
+        if month not in existing:
+            moved = create_partition(cur, month)
+            created.append(month)
+            print(f"   ✔️ partition {partition_name(month)} created"
+                  + (f" ({moved:,} rows moved from default)" if moved else ""))
+    return created
+
+
+def apply_retention(cur, keep_months: int, today: date = None) -> list:
+    """Drop monthly partitions that end before the retention window."""
+    cutoff = add_months(month_start(today or date.today()), -keep_months)
+    dropped = []
+    for month, name in sorted(existing_partitions(cur).items()):
+        if month < cutoff:
+            cur.execute(f"DROP TABLE warehouse.{name}")
+            dropped.append(name)
+            print(f"   🗑️ partition {name} dropped (older than {keep_months} months)")
+    return dropped
+
+
+def migrate(cur):
+    """One-off: rebuild an unpartitioned fact_sales as the partitioned layout."""
+    cur.execute(f"ALTER TABLE {PARENT} RENAME TO fact_sales_heap")
+    cur.execute(f"CREATE TABLE {PARENT} (LIKE warehouse.fact_sales_heap INCLUDING DEFAULTS) PARTITION BY RANGE (date_id)")
+    cur.execute(f"CREATE TABLE warehouse.{DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT")
+
+    cur.execute("SELECT MIN(date_id), MAX(date_id) FROM warehouse.fact_sales_heap")
+    lo, hi = cur.fetchone()
+    if lo is not None:
+        first = date(lo // 10_000, lo // 100 % 100, 1)
+        last = date(hi // 10_000, hi // 100 % 100, 1)
+        ensure_partitions(cur, first, add_months(last, MONTHS_AHEAD))
+
+    cur.execute(f"INSERT INTO {PARENT} SELECT * FROM warehouse.fact_sales_heap ORDER BY date_id")
+    # views built on the old table (analytics daily_revenue, ML_query.sql) go with it;
+    # rerun analytics.sql / ML_query.sql afterwards
+    cur.execute("DROP TABLE warehouse.fact_sales_heap CASCADE")
+    cur.execute(INDEX_SQL)
+    cur.execute(f"ANALYZE {PARENT}")
+
+
+def maintain(engine=None, months_ahead: int = MONTHS_AHEAD, retention_months: int = RETENTION_MONTHS,
+             migrate_if_needed: bool = False) -> dict:
+    """Create partitions through `months_ahead` months from now and apply retention."""
+    engine = engine or get_engine()
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        if not is_partitioned(cur):
+            if not migrate_if_needed:
+                raise RuntimeError(f"{PARENT} is not partitioned — run with --migrate first.")
+            print(f"Migrating {PARENT} to monthly partitions...")
+            migrate(cur)
+
+        today = date.today()
+        created = ensure_partitions(cur, month_start(today), add_months(month_start(today), months_ahead))
+        dropped = apply_retention(cur, retention_months, today) if retention_months else []
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    print(f"✅ Partitions: {len(created)} created, {len(dropped)} dropped.")
+    return {"created": [partition_name(m) for m in created], "dropped": dropped}
+
+
+if __name__ == "__main__":
+    retention = RETENTION_MONTHS
+    if "--retention-months" in sys.argv:
+        retention = int(sys.argv[sys.argv.index("--retention-months") + 1])
+    maintain(retention_months=retention, migrate_if_needed="--migrate" in sys.argv)
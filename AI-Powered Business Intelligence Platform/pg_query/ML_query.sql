@@ -1,7 +1,25 @@
--- ML-ready feature views in Postgres
+-- ML-ready feature tables in Postgres
+-- Materialized as indexed tables (full build here); feature_store.py
+-- refreshes only the date ranges touched by new/changed sales.
+
+-- Earlier builds created these as plain views; reruns find tables
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['ml_daily_demand', 'ml_inventory', 'ml_daily_payments',
+                             'ml_daily_demand_category_region', 'ml_demand_features']
+    LOOP
+        IF EXISTS (SELECT 1 FROM pg_views WHERE schemaname = 'analytics' AND viewname = t) THEN
+            EXECUTE format('DROP VIEW analytics.%I CASCADE', t);
+        ELSIF to_regclass('analytics.' || t) IS NOT NULL THEN
+            EXECUTE format('DROP TABLE analytics.%I CASCADE', t);
+        END IF;
+    END LOOP;
+END $$;
 
 -- Daily demand per product + region
-CREATE OR REPLACE VIEW analytics.ml_daily_demand AS
+CREATE TABLE analytics.ml_daily_demand AS
 SELECT
   d.full_date,
   f.product_id,
@@ -16,10 +34,13 @@ JOIN warehouse.dim_customer c  ON f.customer_id = c.customer_id
 JOIN warehouse.dim_product p   ON f.product_id = p.product_id
 GROUP BY d.full_date, f.product_id, c.region;
 
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ml_daily_demand_key ON analytics.ml_daily_demand(full_date, product_id, region);
+CREATE INDEX IF NOT EXISTS idx_ml_daily_demand_product ON analytics.ml_daily_demand(product_id);
+
 
 
 -- Inventory snapshot
-CREATE OR REPLACE VIEW analytics.ml_inventory AS
+CREATE TABLE analytics.ml_inventory AS
 SELECT
   fi.product_id,
   dw.region AS warehouse_region,
@@ -28,9 +49,11 @@ FROM warehouse.fact_inventory fi
 JOIN warehouse.dim_warehouse dw ON fi.warehouse_id = dw.warehouse_id
 GROUP BY fi.product_id, dw.region;
 
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ml_inventory_key ON analytics.ml_inventory(product_id, warehouse_region);
+
 
 -- Payments daily (financial signal)
-CREATE OR REPLACE VIEW analytics.ml_daily_payments AS
+CREATE TABLE analytics.ml_daily_payments AS
 SELECT
   d.full_date,
   SUM(fp.amount_paid) AS total_paid
@@ -38,3 +61,43 @@ FROM warehouse.fact_payments fp
 JOIN warehouse.dim_date d ON fp.date_id = d.date_id
 GROUP BY d.full_date;
 
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ml_daily_payments_key ON analytics.ml_daily_payments(full_date);
+
+
+-- Daily demand per category + region (forecasting history, app.py HISTORY_TABLE)
+CREATE TABLE analytics.ml_daily_demand_category_region AS
+SELECT
+  m.full_date AS date,
+  p.category,
+  m.region,
+  SUM(m.daily_qty) AS quantity
+FROM analytics.ml_daily_demand m
+JOIN warehouse.dim_product p ON m.product_id = p.product_id
+GROUP BY m.full_date, p.category, m.region;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ml_demand_cr_key ON analytics.ml_daily_demand_category_region(category, region, date);
+CREATE INDEX IF NOT EXISTS idx_ml_demand_cr_date ON analytics.ml_daily_demand_category_region(date);
+
+
+-- Model features per category + region + day (same as make_features:
+-- calendar fields, lags by row, 7-row mean of the previous rows)
+CREATE TABLE analytics.ml_demand_features AS
+SELECT
+  date,
+  category,
+  region,
+  quantity,
+  (EXTRACT(ISODOW FROM date)::INT - 1) AS dow,
+  EXTRACT(MONTH FROM date)::INT AS month,
+  CASE WHEN EXTRACT(ISODOW FROM date) >= 6 THEN 1 ELSE 0 END AS is_weekend,
+  LAG(quantity, 1) OVER w AS lag_1,
+  LAG(quantity, 7) OVER w AS lag_7,
+  LAG(quantity, 14) OVER w AS lag_14,
+  CASE WHEN COUNT(quantity) OVER w7 = 7 THEN AVG(quantity) OVER w7 END AS rollmean_7
+FROM analytics.ml_daily_demand_category_region
+WINDOW
+  w AS (PARTITION BY category, region ORDER BY date),
+  w7 AS (PARTITION BY category, region ORDER BY date ROWS BETWEEN 7 PRECEDING AND 1 PRECEDING);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ml_demand_features_key ON analytics.ml_demand_features(category, region, date);
+CREATE INDEX IF NOT EXISTS idx_ml_demand_features_date ON analytics.ml_demand_features(date);
@@ -1,5 +1,8 @@
 -- =====================================================
 -- ANALYTICS KPI LAYER — SINGLE FILE (PostgreSQL)
+-- Full rebuild. Nightly updates: kpi_maintenance.py keeps
+-- the same tables current from the incremental refresh
+-- deltas (python kpi_maintenance.py --verify to diff).
 -- =====================================================
 
 CREATE SCHEMA IF NOT EXISTS analytics;
@@ -78,29 +81,68 @@ FROM (
 
 DROP TABLE IF EXISTS analytics.inventory_kpis;
 
+-- Stock (product × warehouse) and sales are aggregated per product first and
+-- joined once: joining fact_inventory to fact_sales directly repeats every
+-- sale once per warehouse row and inflates both sums.
 CREATE TABLE analytics.inventory_kpis AS
 SELECT
-    fi.product_id,
+    st.product_id,
     dp.product_name,
 
-    SUM(fi.stock_qty) AS total_stock,
-    COALESCE(SUM(fs.quantity),0) AS total_sold,
+    st.total_stock,
+    COALESCE(sa.total_sold, 0) AS total_sold,
 
     CASE 
-        WHEN SUM(fi.stock_qty) = 0 THEN 1 
+        WHEN st.total_stock = 0 THEN 1 
         ELSE 0 
     END AS stockout_flag,
 
     COALESCE(
-        SUM(fs.quantity)::float / NULLIF(SUM(fi.stock_qty),0),0
+        sa.total_sold::float / NULLIF(st.total_stock, 0), 0
     ) AS inventory_turnover
 
-FROM warehouse.fact_inventory fi
-LEFT JOIN warehouse.fact_sales fs 
-    ON fi.product_id = fs.product_id
+FROM (
+    SELECT product_id, SUM(stock_qty) AS total_stock
+    FROM warehouse.fact_inventory
+    GROUP BY product_id
+) st
+LEFT JOIN (
+    SELECT product_id, SUM(quantity) AS total_sold
+    FROM warehouse.fact_sales
+    GROUP BY product_id
+) sa
+    ON st.product_id = sa.product_id
 JOIN warehouse.dim_product dp 
-    ON fi.product_id = dp.product_id
-GROUP BY fi.product_id, dp.product_name;
+    ON st.product_id = dp.product_id;
+
+-- Regression check: totals must match independent aggregates
+DO $$
+DECLARE
+    kpi_stock NUMERIC;
+    kpi_sold  NUMERIC;
+    ref_stock NUMERIC;
+    ref_sold  NUMERIC;
+BEGIN
+    SELECT COALESCE(SUM(total_stock), 0), COALESCE(SUM(total_sold), 0)
+    INTO kpi_stock, kpi_sold
+    FROM analytics.inventory_kpis;
+
+    SELECT COALESCE(SUM(fi.stock_qty), 0) INTO ref_stock
+    FROM warehouse.fact_inventory fi
+    WHERE EXISTS (SELECT 1 FROM warehouse.dim_product dp WHERE dp.product_id = fi.product_id);
+
+    SELECT COALESCE(SUM(fs.quantity), 0) INTO ref_sold
+    FROM warehouse.fact_sales fs
+    WHERE fs.product_id IN (
+        SELECT fi.product_id FROM warehouse.fact_inventory fi
+        JOIN warehouse.dim_product dp ON dp.product_id = fi.product_id
+    );
+
+    IF kpi_stock <> ref_stock OR kpi_sold <> ref_sold THEN
+        RAISE EXCEPTION 'inventory_kpis totals off: stock % vs %, sold % vs %',
+            kpi_stock, ref_stock, kpi_sold, ref_sold;
+    END IF;
+END $$;
 
 
 -- =====================================================
@@ -78,8 +78,49 @@ FROM generate_series('2023-01-01'::DATE, '2030-12-31'::DATE, '1 day') AS d;
 
 -- 3️⃣ Fact Tables
 
--- fact_sales
-CREATE TABLE IF NOT EXISTS warehouse.fact_sales AS
+-- fact_sales: range-partitioned by month on date_id (YYYYMMDD), so queries
+-- filtering on f.date_id only read the partitions they need.
+-- partition_manager.py creates months ahead and applies retention.
+CREATE TABLE IF NOT EXISTS warehouse.fact_sales (
+    order_id BIGINT,
+    product_id BIGINT,
+    customer_id BIGINT,
+    date_id INT,
+    quantity BIGINT,
+    revenue DOUBLE PRECISION,
+    cost DOUBLE PRECISION,
+    profit DOUBLE PRECISION,
+    payment_method TEXT,
+    order_status TEXT
+) PARTITION BY RANGE (date_id);
+
+CREATE TABLE IF NOT EXISTS warehouse.fact_sales_default PARTITION OF warehouse.fact_sales DEFAULT;
+
+-- one partition per month of order history, plus 3 months ahead
+DO $$
+DECLARE
+    m DATE;
+BEGIN
+    FOR m IN
+        SELECT g.m::date
+        FROM (
+            SELECT date_trunc('month', MIN(order_date)) AS lo,
+                   date_trunc('month', MAX(order_date)) + INTERVAL '3 months' AS hi
+            FROM staging.cleaned_orders
+        ) b,
+        generate_series(b.lo, b.hi, INTERVAL '1 month') AS g(m)
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS warehouse.%I PARTITION OF warehouse.fact_sales FOR VALUES FROM (%s) TO (%s)',
+            'fact_sales_' || to_char(m, 'YYYYMM'),
+            to_char(m, 'YYYYMMDD'),
+            to_char(m + INTERVAL '1 month', 'YYYYMMDD')
+        );
+    END LOOP;
+END $$;
+
+-- loaded in date order so BRIN ranges stay tight
+INSERT INTO warehouse.fact_sales
 SELECT
     oi.order_id,
     oi.product_id,
@@ -93,7 +134,9 @@ SELECT
     o.status AS order_status
 FROM staging.cleaned_order_items oi
 JOIN staging.cleaned_orders o ON oi.order_id = o.order_id
-JOIN staging.cleaned_products p ON oi.product_id = p.product_id;
+JOIN staging.cleaned_products p ON oi.product_id = p.product_id
+WHERE NOT EXISTS (SELECT 1 FROM warehouse.fact_sales)
+ORDER BY date_id;
 
 -- fact_payments
 CREATE TABLE IF NOT EXISTS warehouse.fact_payments AS
@@ -128,8 +171,8 @@ FROM staging.cleaned_inventory i;
 
 -- 4️⃣ Indexes for Performance
 
--- fact_sales indexes
-CREATE INDEX IF NOT EXISTS idx_fact_sales_date ON warehouse.fact_sales(date_id);
+-- fact_sales indexes (created on every partition)
+CREATE INDEX IF NOT EXISTS idx_fact_sales_date_brin ON warehouse.fact_sales USING BRIN (date_id);
 CREATE INDEX IF NOT EXISTS idx_fact_sales_product ON warehouse.fact_sales(product_id);
 CREATE INDEX IF NOT EXISTS idx_fact_sales_customer ON warehouse.fact_sales(customer_id);
 
@@ -0,0 +1,88 @@
+# publish() runs its Postgres SQL against an in-memory DuckDB: the cursor
+# wrapper maps %(keys)s to DuckDB's $keys and runs one statement at a time.
+
+import os
+import sys
+
+import duckdb
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kpi_maintenance  # noqa: E402
+
+
+class DuckCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        for statement in sql.replace("%(keys)s", "$keys").split(";"):
+            if not statement.strip():
+                continue
+            if "$keys" in statement:
+                self.conn.execute(statement, {"keys": params["keys"]})
+            else:
+                self.conn.execute(statement)
+
+
+WAREHOUSE_SQL = """
+CREATE SCHEMA warehouse;
+CREATE TABLE warehouse.dim_date (date_id INT, full_date DATE);
+CREATE TABLE warehouse.dim_customer (customer_id BIGINT, name TEXT);
+CREATE TABLE warehouse.dim_product (product_id BIGINT, product_name TEXT);
+CREATE TABLE warehouse.dim_warehouse (warehouse_id BIGINT, warehouse_name TEXT);
+CREATE TABLE warehouse.fact_inventory (product_id BIGINT, stock_qty INT);
+
+INSERT INTO warehouse.dim_date VALUES (1, '2024-01-01'), (2, '2024-01-02');
+INSERT INTO warehouse.dim_customer VALUES (10, 'Ana'), (20, 'Ben'), (30, 'Cy');
+INSERT INTO warehouse.dim_product VALUES (100, 'Lamp');
+INSERT INTO warehouse.dim_warehouse VALUES (1, 'North');
+INSERT INTO warehouse.fact_inventory VALUES (100, 5);
+"""
+
+STATE_ROWS_SQL = """
+INSERT INTO analytics.kpi_daily_state VALUES (1, 50, 10, 3, 2), (2, 30, 6, 2, 1);
+INSERT INTO analytics.kpi_customer_state VALUES (10, 50, 2), (20, 30, 1);
+INSERT INTO analytics.kpi_product_state VALUES (100, 5);
+INSERT INTO analytics.kpi_warehouse_state VALUES (1, 6, 3);
+"""
+
+
+@pytest.fixture
+def cur():
+    conn = duckdb.connect()
+    cursor = DuckCursor(conn)
+    cursor.execute(WAREHOUSE_SQL)
+    cursor.execute(kpi_maintenance.STATE_SQL)
+    cursor.execute(kpi_maintenance.KPI_TABLES_SQL)
+    cursor.execute(STATE_ROWS_SQL)
+    yield cursor
+    conn.close()
+
+
+def _clv(cur):
+    return cur.conn.execute(
+        "SELECT customer_id, name, lifetime_value, total_orders "
+        "FROM analytics.customer_clv ORDER BY customer_id").fetchall()
+
+
+def test_full_publish(cur):
+    kpi_maintenance.publish(cur)
+
+    assert _clv(cur) == [(10, "Ana", 50.0, 2), (20, "Ben", 30.0, 1)]
+    assert cur.conn.execute("SELECT total_orders, total_customers FROM analytics.core_kpis").fetchone() == (3, 2)
+
+
+def test_incremental_customer_publish(cur):
+    kpi_maintenance.publish(cur)
+
+    # a new batch: Ben orders again, Cy orders for the first time, Ana is untouched
+    cur.conn.execute("UPDATE analytics.kpi_customer_state SET revenue = 45, orders = 2 WHERE customer_id = 20")
+    cur.conn.execute("INSERT INTO analytics.kpi_customer_state VALUES (30, 12, 1)")
+    cur.conn.execute("UPDATE analytics.kpi_customer_state SET revenue = 999 WHERE customer_id = 10")
+
+    kpi_maintenance.publish(cur, dates=[], customers=[20, 30], products=[])
+
+    assert _clv(cur) == [(10, "Ana", 50.0, 2), (20, "Ben", 45.0, 2), (30, "Cy", 12.0, 1)]
+    assert cur.conn.execute("SELECT COUNT(*) FROM analytics.daily_revenue").fetchone() == (2,)